@@ -1,16 +1,16 @@
 """聊天API路由 - OpenAI兼容的聊天接口"""
 
 import time
-import uuid
+from os import urandom
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import Optional, Dict, Any
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from app.core.auth import auth_manager
+from app.core.auth import AuthInfo, VERIFY_DEP
 from app.core.config import setting
 from app.core.context import request_base_url
-from app.core.exception import GrokApiException
+from app.core.exception import CORS_HEADERS, GrokApiException
 from app.core.logger import logger
 from app.services.grok.client import GrokClient
 from app.models.openai_schema import OpenAIChatRequest
@@ -20,45 +20,156 @@ from app.services.request_logger import request_logger
 
 router = APIRouter(prefix="/chat", tags=["聊天"])
 
-# 并发控制信号量（延迟初始化）
-_chat_semaphore: Optional[asyncio.Semaphore] = None
+# 流式响应头（只读共享）
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    **CORS_HEADERS,
+}
 
+# 流式合并输出上限与结束标记
+_STREAM_BATCH_SIZE = 8192
+_STREAM_EOF = object()
 
-def _get_chat_semaphore() -> asyncio.Semaphore:
-    """获取聊天并发信号量"""
-    global _chat_semaphore
-    if _chat_semaphore is None:
+
+class ChatAdmission:
+    """聊天并发准入控制 - Condition + 计数器，支持运行时调整上限"""
+
+    def __init__(self, cmax: int):
+        self.active = 0
+        self.waiters = 0
+        self.cmax = cmax
+        self._cond = asyncio.Condition(asyncio.Lock())
+
+    async def try_acquire(self, timeout: float = 0) -> bool:
+        """尝试获取执行槽位
+
+        timeout <= 0 时满载立即拒绝；否则最多等待 timeout 秒。
+        返回 False 表示应拒绝请求。
+        """
+        async with self._cond:
+            if self.active + self.waiters >= self.cmax and timeout <= 0:
+                return False
+
+            self.waiters += 1
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.active < self.cmax),
+                    timeout=timeout if timeout > 0 else None
+                )
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiters -= 1
+
+            self.active += 1
+            return True
+
+    async def release(self) -> None:
+        """释放执行槽位"""
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify(1)
+
+    async def set_cmax(self, n: int) -> None:
+        """调整并发上限（唤醒所有等待者重新判断）"""
+        async with self._cond:
+            self.cmax = n
+            self._cond.notify_all()
+
+
+# 并发准入控制（延迟初始化）
+_chat_admission: Optional[ChatAdmission] = None
+
+
+def _get_chat_admission() -> ChatAdmission:
+    """获取聊天并发准入控制器"""
+    global _chat_admission
+    if _chat_admission is None:
         max_concurrency = setting.global_config.get("max_request_concurrency", 50)
-        _chat_semaphore = asyncio.Semaphore(max_concurrency)
+        _chat_admission = ChatAdmission(max_concurrency)
         logger.info(f"[Chat] 初始化并发限制: {max_concurrency}")
-    return _chat_semaphore
+    return _chat_admission
 
 
-def reset_chat_semaphore():
-    """重置信号量（配置变更时调用）"""
-    global _chat_semaphore
-    _chat_semaphore = None
+async def reset_chat_admission() -> None:
+    """按最新配置调整并发上限（配置变更时调用）"""
+    if _chat_admission is None:
+        return
+    max_concurrency = setting.global_config.get("max_request_concurrency", 50)
+    await _chat_admission.set_cmax(max_concurrency)
+    logger.info(f"[Chat] 并发限制已更新: {max_concurrency}")
+
+
+async def _pump_stream(result, queue: asyncio.Queue) -> None:
+    """后台读取上游数据块写入队列，结束写入 EOF，异常写入异常对象"""
+    try:
+        async for chunk in result:
+            await queue.put(chunk)
+        await queue.put(_STREAM_EOF)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+
+
+async def _coalesce_stream(result):
+    """合并已就绪的数据块后再输出（不额外等待，单次最多约 8KB），减少写入次数"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+    reader = asyncio.create_task(_pump_stream(result, queue))
+    try:
+        while True:
+            item = await queue.get()
+            batch = []
+            size = 0
+            while item is not _STREAM_EOF and not isinstance(item, Exception):
+                batch.append(item)
+                size += len(item)
+                if size >= _STREAM_BATCH_SIZE or queue.empty():
+                    break
+                item = queue.get_nowait()
+            else:
+                # 上游结束或出错：先输出已合并部分
+                if batch:
+                    yield batch[0][:0].join(batch)
+                if item is _STREAM_EOF:
+                    return
+                raise item
+            yield batch[0][:0].join(batch)  # str/bytes 通用拼接
+    finally:
+        reader.cancel()
+
+
+async def _stream_with_logging(result, ip: str, model: str, key_name: str, start_ns: int):
+    """透传流式响应，结束时记录日志"""
+    try:
+        async for chunk in _coalesce_stream(result):
+            yield chunk
+    finally:
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, 200, key_name)
 
 
 @router.post("/completions", response_model=None)
 async def chat_completions(
     request: Request,
     body: OpenAIChatRequest,
-    auth_info: Dict[str, Any] = Depends(auth_manager.verify)
+    auth_info: AuthInfo = VERIFY_DEP
 ):
     """创建聊天补全（支持流式和非流式）"""
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     model = body.model
     ip = request.client.host
-    key_name = auth_info.get("name", "Unknown")
-    request_id = uuid.uuid4().hex[:8]
+    key_name = auth_info.name
+    request_id = urandom(4).hex()
 
     status_code = 200
     error_msg = ""
 
     # 并发限制检查
-    sem = _get_chat_semaphore()
-    if sem.locked() and sem._value == 0:
+    admission = _get_chat_admission()
+    if not await admission.try_acquire(timeout=0):
         logger.warning(f"[Chat] [{request_id}] 并发超限，拒绝请求: {key_name} @ {ip}")
         raise HTTPException(
             status_code=429,
@@ -72,59 +183,46 @@ async def chat_completions(
         )
 
     try:
-        async with sem:
-            logger.info(f"[Chat] [{request_id}] 收到聊天请求: {key_name} @ {ip}")
-
-            # 自动检测 base_url（未配置时从请求头推断）
-            if not setting.global_config.get("base_url"):
-                host = request.headers.get("x-forwarded-host") or request.headers.get("host", "")
-                scheme = request.headers.get("x-forwarded-proto") or request.url.scheme
-                if host:
-                    request_base_url.set(f"{scheme}://{host}")
-
-            # 调用Grok客户端
-            result = await GrokClient.openai_to_grok(body.model_dump())
-
-            # 记录成功统计
-            await request_stats.record_request(model, success=True)
-
-            # 流式响应
-            if body.stream:
-                async def stream_wrapper():
-                    try:
-                        async for chunk in result:
-                            yield chunk
-                    finally:
-                        # 流式结束记录日志
-                        duration = time.time() - start_time
-                        await request_logger.add_log(ip, model, duration, 200, key_name)
-
-                return StreamingResponse(
-                    content=stream_wrapper(),
-                    media_type="text/event-stream",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "Connection": "keep-alive",
-                        "X-Accel-Buffering": "no",
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "Authorization, Content-Type",
-                        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    }
-                )
+        logger.info(f"[Chat] [{request_id}] 收到聊天请求: {key_name} @ {ip}")
+
+        # 自动检测 base_url（未配置时从请求头推断）
+        if not setting.global_config.get("base_url"):
+            host = request.headers.get("x-forwarded-host") or request.headers.get("host", "")
+            scheme = request.headers.get("x-forwarded-proto") or request.url.scheme
+            if host:
+                request_base_url.set(f"{scheme}://{host}")
+
+        # 调用Grok客户端（仅传递用到的字段，消息列表直接引用不复制）
+        result = await GrokClient.openai_to_grok({
+            "model": body.model,
+            "messages": body.messages,
+            "stream": body.stream,
+        })
+
+        # 记录成功统计
+        request_stats.record(model, success=True)
+
+        # 流式响应
+        if body.stream:
+            return StreamingResponse(
+                content=_stream_with_logging(result, ip, model, key_name, start_ns),
+                media_type="text/event-stream",
+                headers=_SSE_HEADERS
+            )
 
-            # 非流式响应 - 记录日志
-            duration = time.time() - start_time
-            await request_logger.add_log(ip, model, duration, 200, key_name)
-            return result
+        # 非流式响应 - 记录日志
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, 200, key_name)
+        return ORJSONResponse(result)
 
     except GrokApiException as e:
         status_code = e.status_code or 500
         error_msg = str(e)
-        await request_stats.record_request(model, success=False)
+        request_stats.record(model, success=False)
         logger.error(f"[Chat] [{request_id}] Grok API错误: {e} - 详情: {e.details}")
 
-        duration = time.time() - start_time
-        await request_logger.add_log(ip, model, duration, status_code, key_name, error=error_msg)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, status_code, key_name, error=error_msg)
 
         raise HTTPException(
             status_code=status_code,
@@ -141,11 +239,11 @@ async def chat_completions(
     except Exception as e:
         status_code = 500
         error_msg = str(e)
-        await request_stats.record_request(model, success=False)
+        request_stats.record(model, success=False)
         logger.error(f"[Chat] [{request_id}] 处理失败: {e}")
 
-        duration = time.time() - start_time
-        await request_logger.add_log(ip, model, duration, status_code, key_name, error=error_msg)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, status_code, key_name, error=error_msg)
 
         raise HTTPException(
             status_code=500,
@@ -157,3 +255,5 @@ async def chat_completions(
                 }
             }
         )
+    finally:
+        await admission.release()
@@ -2,15 +2,16 @@
 
 import re
 import time
-import uuid
-from typing import Dict, Any, Optional, List
-from fastapi import APIRouter, Depends, HTTPException, Request
+from os import urandom
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from app.core.auth import auth_manager
+from app.core.auth import AuthInfo, VERIFY_DEP
 from app.core.config import setting
 from app.core.context import request_base_url
-from app.core.exception import GrokApiException
+from app.core.exception import CORS_HEADERS, GrokApiException
 from app.core.logger import logger
 from app.services.grok.client import GrokClient
 from app.services.request_stats import request_stats
@@ -19,6 +20,17 @@ from app.services.request_logger import request_logger
 
 router = APIRouter(prefix="/images", tags=["图片生成"])
 
+# 流式响应头（只读共享）
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    **CORS_HEADERS,
+}
+
+# markdown 图片链接 ![...](url)，匹配远程 URL 与本地缓存路径
+_IMG_RE = re.compile(r'!\[[^\]]*?\]\((https?://[^\s)]+|/images/[^\s)]+)\)')
+
 
 class ImageGenerationRequest(BaseModel):
     """OpenAI 兼容的图片生成请求"""
@@ -30,18 +42,28 @@ class ImageGenerationRequest(BaseModel):
     stream: bool = Field(False, description="是否流式响应")
 
 
+async def _stream_with_logging(result, ip: str, model: str, key_name: str, start_ns: int):
+    """透传流式响应，结束时记录日志"""
+    try:
+        async for chunk in result:
+            yield chunk
+    finally:
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, 200, key_name)
+
+
 @router.post("/generations")
 async def create_image(
     request: Request,
     body: ImageGenerationRequest,
-    auth_info: Dict[str, Any] = Depends(auth_manager.verify),
+    auth_info: AuthInfo = VERIFY_DEP,
 ):
     """创建图片（OpenAI 兼容）"""
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     ip = request.client.host
-    key_name = auth_info.get("name", "Unknown")
+    key_name = auth_info.name
     model = body.model
-    request_id = uuid.uuid4().hex[:8]
+    request_id = urandom(4).hex()
 
     try:
         logger.info(f"[ImageGen] [{request_id}] 图片生成请求: {key_name} @ {ip}, prompt={body.prompt[:50]}...")
@@ -63,46 +85,31 @@ async def create_image(
         }
 
         result = await GrokClient.openai_to_grok(chat_request)
-        await request_stats.record_request(model, success=True)
+        request_stats.record(model, success=True)
 
         if body.stream:
             # 流式直接透传
-            from fastapi.responses import StreamingResponse
-
-            async def stream_wrapper():
-                try:
-                    async for chunk in result:
-                        yield chunk
-                finally:
-                    duration = time.time() - start_time
-                    await request_logger.add_log(ip, model, duration, 200, key_name)
-
             return StreamingResponse(
-                content=stream_wrapper(),
+                content=_stream_with_logging(result, ip, model, key_name, start_ns),
                 media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "X-Accel-Buffering": "no",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Authorization, Content-Type",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                },
+                headers=_SSE_HEADERS,
             )
 
         # 非流式：从响应中提取图片 URL
         content = ""
-        if hasattr(result, "choices") and result.choices:
-            content = result.choices[0].message.content or ""
+        if choices := result.get("choices"):
+            content = choices[0]["message"]["content"] or ""
 
-        # 解析 markdown 图片链接 ![...](url)
-        image_urls = re.findall(r'!\[.*?\]\((https?://[^\s)]+)\)', content)
-
-        # 也匹配本地缓存路径
-        local_urls = re.findall(r'!\[.*?\]\((/images/[^\s)]+)\)', content)
+        # 解析 markdown 图片链接（远程 URL 在前，本地缓存路径补全 base_url 后在后）
         base_url = setting.global_config.get("base_url", "")
-        for local in local_urls:
-            image_urls.append(f"{base_url}{local}" if base_url else local)
+        image_urls, local_urls = [], []
+        for m in _IMG_RE.finditer(content):
+            url = m.group(1)
+            if url.startswith("/"):
+                local_urls.append(f"{base_url}{url}" if base_url else url)
+            else:
+                image_urls.append(url)
+        image_urls.extend(local_urls)
 
         image_data = []
         for url in image_urls[:body.n]:
@@ -112,8 +119,8 @@ async def create_image(
             else:
                 image_data.append({"url": url})
 
-        duration = time.time() - start_time
-        await request_logger.add_log(ip, model, duration, 200, key_name)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, 200, key_name)
 
         return {
             "created": int(time.time()),
@@ -122,9 +129,9 @@ async def create_image(
 
     except GrokApiException as e:
         status_code = e.status_code or 500
-        await request_stats.record_request(model, success=False)
-        duration = time.time() - start_time
-        await request_logger.add_log(ip, model, duration, status_code, key_name, error=str(e))
+        request_stats.record(model, success=False)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, status_code, key_name, error=str(e))
         logger.error(f"[ImageGen] [{request_id}] 错误: {e}")
         raise HTTPException(
             status_code=status_code,
@@ -133,9 +140,9 @@ async def create_image(
     except HTTPException:
         raise
     except Exception as e:
-        await request_stats.record_request(model, success=False)
-        duration = time.time() - start_time
-        await request_logger.add_log(ip, model, duration, 500, key_name, error=str(e))
+        request_stats.record(model, success=False)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+        request_logger.log_nowait(ip, model, duration, 500, key_name, error=str(e))
         logger.error(f"[ImageGen] [{request_id}] 内部错误: {e}")
         raise HTTPException(
             status_code=500,
@@ -1,14 +1,27 @@
 """图片服务API - 代理缓存的图片和视频文件，支持按需下载"""
 
+import os
+import time
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 
 from app.core.logger import logger
+from app.models.grok_models import TokenType
 from app.services.grok.cache import image_cache_service, video_cache_service
+from app.services.grok.token import token_manager
 
 
 router = APIRouter()
 
+# 下载 token 缓存（有效期内复用，token 状态变化时失效）
+_DL_TOKEN_TTL = 10
+_dl_token_cache = {"sso": "", "token": "", "exp": 0.0}
+
+# 视频扩展名（最长 5 字符，只需对结尾切片做小写比较）
+_VIDEO_EXTS = ('.mp4', '.webm', '.mov', '.avi')
+
 
 @router.get("/images/{img_path:path}")
 async def get_image(img_path: str):
@@ -23,7 +36,7 @@ async def get_image(img_path: str):
         original_path = "/" + img_path
 
         # 判断类型
-        is_video = any(original_path.lower().endswith(ext) for ext in ['.mp4', '.webm', '.mov', '.avi'])
+        is_video = original_path[-5:].lower().endswith(_VIDEO_EXTS)
 
         if is_video:
             cache_service = video_cache_service
@@ -33,18 +46,19 @@ async def get_image(img_path: str):
             media_type = "image/jpeg"
 
         # 1. 检查缓存
-        cache_path = cache_service.get_cached(original_path)
-        if cache_path and cache_path.exists():
+        # 每个请求只 stat 一次：既判断存在性，又作为 FileResponse 的 stat_result
+        cache_path, stat_result = cache_service.lookup(original_path)
+        if stat_result:
             logger.debug(f"[MediaAPI] 缓存命中: {cache_path}")
-            return _file_response(cache_path, media_type)
+            return _file_response(cache_path, media_type, stat_result)
 
         # 2. 按需从 assets.grok.com 下载（使用任意可用 token）
         token = await _get_download_token()
         if token:
             logger.info(f"[MediaAPI] 按需下载: {original_path}")
             cache_path = await cache_service.download(original_path, token)
-            if cache_path and cache_path.exists():
-                return _file_response(cache_path, media_type)
+            if cache_path and (stat_result := cache_service.get_stat(cache_path)):
+                return _file_response(cache_path, media_type, stat_result)
 
         # 3. 文件不存在且无法下载
         logger.warning(f"[MediaAPI] 未找到且无法下载: {original_path}")
@@ -57,10 +71,11 @@ async def get_image(img_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _file_response(path, media_type: str) -> FileResponse:
-    """构建文件响应"""
+def _file_response(path, media_type: str, stat_result: Optional[os.stat_result] = None) -> FileResponse:
+    """构建文件响应（传入 stat_result 时 Starlette 不再重复 stat）"""
     return FileResponse(
         path=str(path),
+        stat_result=stat_result,
         media_type=media_type,
         headers={
             "Cache-Control": "public, max-age=86400",
@@ -72,8 +87,12 @@ def _file_response(path, media_type: str) -> FileResponse:
 async def _get_download_token() -> str:
     """获取用于下载的 token"""
     try:
-        from app.services.grok.token import token_manager
-        from app.models.grok_models import TokenType
+        # 缓存有效且 token 仍为 active 时直接复用
+        sso = _dl_token_cache["sso"]
+        if sso and time.monotonic() < _dl_token_cache["exp"]:
+            _, info = token_manager._find_token(sso)
+            if info and info.get("status") == "active":
+                return _dl_token_cache["token"]
 
         tokens = token_manager.get_tokens()
         # 优先用 normal token
@@ -81,7 +100,10 @@ async def _get_download_token() -> str:
             pool = tokens.get(token_type, {})
             for sso, info in pool.items():
                 if info.get("status") == "active":
-                    return f"sso-rw={sso};sso={sso}"
+                    token = f"sso-rw={sso};sso={sso}"
+                    _dl_token_cache.update(sso=sso, token=token, exp=time.monotonic() + _DL_TOKEN_TTL)
+                    return token
     except Exception as e:
         logger.warning(f"[MediaAPI] 获取下载token失败: {e}")
+    _dl_token_cache["sso"] = ""
     return ""
@@ -1,7 +1,12 @@
 """认证模块 - API令牌验证"""
 
-from typing import Optional, Dict
+import time
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, Dict, Tuple
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from app.core.config import setting
@@ -9,9 +14,26 @@ from app.core.logger import logger
 from app.services.api_keys import api_key_manager
 
 
+@dataclass(slots=True, frozen=True)
+class AuthInfo:
+    """认证结果"""
+    key: Optional[str]
+    name: str
+    is_admin: bool = False
+
+
 # Bearer安全方案
 security = HTTPBearer(auto_error=False)
 
+# 开发模式（未设置任何 Key）下的匿名身份
+_ANONYMOUS = AuthInfo(key=None, name="Anonymous")
+
+# 认证结果缓存: sha256(token) -> (过期时间, Key版本, 认证结果)
+_token_cache: Dict[bytes, Tuple[float, int, AuthInfo]] = {}
+
+# 按 digest 首字节分片的验证锁，避免同一令牌并发重复验证
+_verify_locks = [asyncio.Lock() for _ in range(16)]
+
 
 def _build_error(message: str, code: str = "invalid_token") -> dict:
     """构建认证错误"""
@@ -24,14 +46,37 @@ def _build_error(message: str, code: str = "invalid_token") -> dict:
     }
 
 
+def _cache_get(digest: bytes) -> Optional[AuthInfo]:
+    """读取认证缓存（过期或 Key 列表变更视为未命中）"""
+    hit = _token_cache.get(digest)
+    if hit is None:
+        return None
+    expire_at, version, key_info = hit
+    if time.monotonic() >= expire_at or version != api_key_manager.version:
+        _token_cache.pop(digest, None)
+        return None
+    return key_info
+
+
+def _cache_put(digest: bytes, version: int, key_info: AuthInfo) -> None:
+    """写入认证缓存（version 为验证前读取的 Key 版本；超出上限时淘汰最早写入的条目）"""
+    ttl = setting.global_config.get("auth_cache_ttl", 5)
+    if ttl <= 0:
+        return
+    max_size = setting.global_config.get("auth_cache_size", 10000)
+    while _token_cache and len(_token_cache) >= max_size:
+        _token_cache.pop(next(iter(_token_cache)))
+    _token_cache[digest] = (time.monotonic() + ttl, version, key_info)
+
+
 class AuthManager:
     """认证管理器 - 验证API令牌"""
 
     @staticmethod
-    async def verify(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict:
+    async def verify(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> AuthInfo:
         """验证令牌，返回 Key 信息"""
         api_key = setting.grok_config.get("api_key")
-        
+
         # 初始化检查
         if not hasattr(api_key_manager, '_keys'):
            await api_key_manager.init()
@@ -41,26 +86,58 @@ class AuthManager:
             # 如果未设置全局Key且没有多Key，则跳过（开发模式）
             if not api_key and not api_key_manager.get_all_keys():
                 logger.debug("[Auth] 未设置API_KEY，跳过验证")
-                return {"key": None, "name": "Anonymous"}
-                
+                return _ANONYMOUS
+
             raise HTTPException(
                 status_code=401,
                 detail=_build_error("缺少认证令牌", "missing_token")
             )
 
         token = credentials.credentials
-        
-        # 验证令牌 (支持多 Key)
-        key_info = api_key_manager.validate_key(token)
-        
-        if key_info:
+
+        # 命中缓存直接返回
+        digest = hashlib.sha256(token.encode()).digest()
+        if (key_info := _cache_get(digest)) is not None:
             return key_info
 
+        async with _verify_locks[digest[0] & 0x0F]:
+            if (key_info := _cache_get(digest)) is not None:
+                return key_info
+
+            # 验证前读取版本：验证期间 Key 被吊销时，缓存条目在下次读取即失效
+            version = api_key_manager.version
+
+            # 验证令牌 (支持多 Key)，同步逻辑放入线程池避免阻塞事件循环
+            key_info = await run_in_threadpool(AuthManager._verify_sync, token)
+            if key_info:
+                _cache_put(digest, version, key_info)
+                return key_info
+
         raise HTTPException(
             status_code=401,
             detail=_build_error(f"令牌无效，长度: {len(token)}", "invalid_token")
         )
 
+    @staticmethod
+    def _verify_sync(token: str) -> Optional[AuthInfo]:
+        """同步验证令牌"""
+        key_info = api_key_manager.validate_key(token)
+        if not key_info:
+            return None
+        return AuthInfo(
+            key=key_info.get("key"),
+            name=key_info.get("name", "Unknown"),
+            is_admin=key_info.get("is_admin", False)
+        )
+
+    @staticmethod
+    def clear_cache() -> None:
+        """清空认证缓存"""
+        _token_cache.clear()
+
 
 # 全局实例
-auth_manager = AuthManager()
\ No newline at end of file
+auth_manager = AuthManager()
+
+# 共享依赖（verify 为 staticmethod，各路由复用同一可调用对象）
+VERIFY_DEP = Depends(auth_manager.verify)
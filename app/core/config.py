@@ -38,7 +38,9 @@ DEFAULT_GLOBAL = {
     "max_upload_concurrency": 20,  # 最大并发上传数
     "max_request_concurrency": 50,  # 最大并发请求数
     "batch_save_interval": 1.0,  # 批量保存间隔（秒）
-    "batch_save_threshold": 10  # 触发批量保存的变更数阈值
+    "batch_save_threshold": 10,  # 触发批量保存的变更数阈值
+    "auth_cache_ttl": 5,  # 认证结果缓存时间（秒），Key 吊销最多延迟该时长生效
+    "auth_cache_size": 10000  # 认证结果缓存条目上限
 }
 
 
@@ -164,20 +166,27 @@ class ConfigManager:
         await self.reload()
 
         # 通知依赖方重置缓存
-        self._notify_config_changed()
+        await self._notify_config_changed()
     
-    def _notify_config_changed(self) -> None:
+    async def _notify_config_changed(self) -> None:
         """通知依赖方配置已变更"""
-        # 重置上传信号量
+        # 清空认证缓存（全局 api_key 可能已变更）
+        try:
+            from app.core.auth import auth_manager
+            auth_manager.clear_cache()
+        except ImportError:
+            pass
+        # 唤醒上传等待者按新上限重新判断
         try:
             from app.services.grok.client import GrokClient
-            GrokClient._upload_sem = None
+            if GrokClient._upload_sem is not None:
+                await GrokClient._upload_sem.refresh()
         except ImportError:
             pass
-        # 重置聊天并发信号量
+        # 调整聊天并发上限
         try:
-            from app.api.v1.chat import reset_chat_semaphore
-            reset_chat_semaphore()
+            from app.api.v1.chat import reset_chat_admission
+            await reset_chat_admission()
         except ImportError:
             pass
 
@@ -2,6 +2,8 @@
 
 import contextvars
 
+from app.core.config import setting
+
 # 当前请求的 base URL（从 Host/X-Forwarded 头自动检测）
 # 用于生成图片/视频的绝对 URL，确保外部客户端能正确加载
 request_base_url: contextvars.ContextVar[str] = contextvars.ContextVar('request_base_url', default='')
@@ -9,5 +11,4 @@ request_base_url: contextvars.ContextVar[str] = contextvars.ContextVar('request_
 
 def get_base_url() -> str:
     """获取 base_url（优先配置，其次自动检测）"""
-    from app.core.config import setting
     return setting.global_config.get("base_url", "") or request_base_url.get("")
@@ -18,6 +18,7 @@ class ProxyPool:
         self._fetch_interval: int = 300  # 5分钟刷新一次
         self._enabled: bool = False
         self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
     
     def configure(self, proxy_url: str, proxy_pool_url: str = "", proxy_pool_interval: int = 300):
         """配置代理池
@@ -71,16 +72,24 @@ class ProxyPool:
     
     async def force_refresh(self) -> Optional[str]:
         """强制刷新代理（用于403错误重试）
-        
+
+        并发调用合并为同一次刷新，避免403突发时重复请求代理池
+
         Returns:
             新的代理URL或None
         """
         if not self._enabled:
             return self._static_proxy
-        
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_once())
+
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh_once(self) -> Optional[str]:
+        """执行一次刷新"""
         async with self._lock:
             await self._fetch_proxy()
-        
         return self._current_proxy
     
     async def _fetch_proxy(self):
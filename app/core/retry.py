@@ -1,12 +1,57 @@
 """通用重试逻辑 - 封装内层403代理池重试 + 外层可配置状态码重试"""
 
+import random
 import asyncio
-from typing import Callable, Awaitable, Any, Optional, List
+from functools import lru_cache
+from typing import Callable, Awaitable, Any, Optional, List, FrozenSet
+from curl_cffi.requests.exceptions import HTTPError, RequestException
 
 from app.core.config import setting
+from app.core.exception import GrokApiException
 from app.core.logger import logger
 
 
+DEFAULT_RETRY_CODES = [401, 429]
+
+# 可重试状态码缓存（配置列表对象变化时重建，支持热更新）
+_retry_codes_src: Optional[List[int]] = None
+_retry_codes: FrozenSet[int] = frozenset(DEFAULT_RETRY_CODES)
+
+
+def get_retry_codes() -> FrozenSet[int]:
+    """获取配置中的可重试状态码集合"""
+    global _retry_codes_src, _retry_codes
+    src = setting.grok_config.get("retry_status_codes", DEFAULT_RETRY_CODES)
+    if src is not _retry_codes_src:
+        _retry_codes = frozenset(src)
+        _retry_codes_src = src
+    return _retry_codes
+
+
+def backoff(attempt: int) -> float:
+    """指数退避 + 抖动（50ms 起步，上限 2s）"""
+    return min(0.05 * 2 ** attempt, 2.0) + random.uniform(0, 0.02)
+
+
+def is_transient(exc: Exception) -> bool:
+    """是否为可快速重试的传输层异常"""
+    if isinstance(exc, GrokApiException):
+        # 读取响应体时的连接中断会被包装为 PROCESS_ERROR 等，按其原因判断
+        if exc.error_code == "NETWORK_ERROR":
+            return True
+        return exc.__cause__ is not None and is_transient(exc.__cause__)
+    if isinstance(exc, HTTPError):
+        return False  # raise_for_status 的状态码错误不属于传输层
+    # curl_cffi 的 ConnectionError/Timeout/ProxyError/SSLError 均继承 RequestException
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError, RequestException))
+
+
+@lru_cache(maxsize=8)
+def _outer_delays(max_outer_retry: int) -> tuple:
+    """外层重试等待时间表"""
+    return tuple(0.1 * (i + 1) for i in range(max_outer_retry + 1))
+
+
 async def async_request_with_retry(
     request_func: Callable[..., Awaitable[Any]],
     *,
@@ -20,9 +65,10 @@ async def async_request_with_retry(
     """通用的双层重试请求函数
 
     Args:
-        request_func: 异步请求函数，签名为 async (proxy: str|None, retry_info: dict) -> result
+        request_func: 异步请求函数，签名为 async (proxy: str|None, outer_retry: int, retry_403_count: int) -> result
             - proxy: 代理URL或None
-            - retry_info: {"outer_retry": int, "retry_403_count": int}
+            - outer_retry: 当前外层重试次数
+            - retry_403_count: 当前403重试次数
             - 返回值约定:
                 - 返回 {"status_code": int, ...} 表示需要重试判断
                 - 返回其他值表示成功
@@ -40,12 +86,14 @@ async def async_request_with_retry(
     Raises:
         request_func 抛出的异常
     """
-    if retry_codes is None:
-        retry_codes = setting.grok_config.get("retry_status_codes", [401, 429])
+    codes = get_retry_codes() if retry_codes is None else frozenset(retry_codes)
+    delays = _outer_delays(max_outer_retry)
 
     from app.core.proxy_pool import proxy_pool
 
     last_result = None
+    proxy = None
+    need_proxy = True  # 首次或外层重试（状态码/网络异常）后重新获取代理，其余情况复用上次代理
 
     for outer_retry in range(max_outer_retry + 1):
         retry_403_count = 0
@@ -55,26 +103,23 @@ async def async_request_with_retry(
             if retry_403_count > 0 and use_proxy_pool_for_403 and proxy_pool._enabled:
                 logger.info(f"{log_prefix} 403重试 {retry_403_count}/{max_403_retries}，刷新代理...")
                 proxy = await proxy_pool.force_refresh()
-            else:
+            elif need_proxy:
                 proxy = await setting.get_proxy_async(proxy_type)
-
-            retry_info = {
-                "outer_retry": outer_retry,
-                "retry_403_count": retry_403_count,
-            }
+                need_proxy = False
 
             try:
-                result = await request_func(proxy, retry_info)
-            except Exception:
-                # 异常由外层处理
-                if outer_retry < max_outer_retry - 1:
-                    logger.warning(f"{log_prefix} 异常，外层重试 ({outer_retry+1}/{max_outer_retry})...")
-                    await asyncio.sleep(0.5)
+                result = await request_func(proxy, outer_retry, retry_403_count)
+            except Exception as e:
+                # 仅传输层异常重试，其余错误直接抛出
+                if is_transient(e) and outer_retry < max_outer_retry - 1:
+                    logger.warning(f"{log_prefix} 网络异常，外层重试 ({outer_retry+1}/{max_outer_retry})...")
+                    await asyncio.sleep(backoff(outer_retry))
+                    need_proxy = True  # 不复用刚刚失败的代理
                     break  # 跳到外层下一次
                 raise
 
             # 检查是否为需要重试的响应
-            if not isinstance(result, dict) or "status_code" not in result:
+            if type(result) is not dict or "status_code" not in result:
                 # 成功
                 if outer_retry > 0 or retry_403_count > 0:
                     logger.info(f"{log_prefix} 重试成功！")
@@ -87,19 +132,20 @@ async def async_request_with_retry(
                 retry_403_count += 1
                 if retry_403_count <= max_403_retries:
                     logger.warning(f"{log_prefix} 遇到403错误，正在重试 ({retry_403_count}/{max_403_retries})...")
-                    await asyncio.sleep(0.5)
+                    await asyncio.sleep(backoff(retry_403_count - 1))
                     continue
                 logger.error(f"{log_prefix} 403错误，已重试{retry_403_count-1}次，放弃")
                 last_result = result
                 break
 
             # 外层可配置状态码重试
-            if status_code in retry_codes:
+            if status_code in codes:
                 if outer_retry < max_outer_retry:
-                    delay = (outer_retry + 1) * 0.1
+                    delay = delays[outer_retry]
                     logger.warning(f"{log_prefix} 遇到{status_code}错误，外层重试 ({outer_retry+1}/{max_outer_retry})，等待{delay}s...")
                     await asyncio.sleep(delay)
                     last_result = result
+                    need_proxy = True
                     break  # 跳出内层，进入外层重试
                 else:
                     logger.error(f"{log_prefix} {status_code}错误，已重试{outer_retry}次，放弃")
@@ -29,6 +29,7 @@ class ApiKeyManager:
         self._keys: List[Dict] = []
         self._lock = asyncio.Lock()
         self._loaded = False
+        self.version = 0  # 每次变更递增，供认证缓存判断失效
         
         self._initialized = True
         logger.debug(f"[ApiKey] 初始化完成: {self.file_path}")
@@ -63,6 +64,7 @@ class ApiKeyManager:
 
     async def _save_data(self):
         """保存 API Keys"""
+        self.version += 1
         if not self._loaded:
             logger.warning("[ApiKey] 尝试在数据未加载时保存，已取消操作以防覆盖数据")
             return
@@ -1,14 +1,19 @@
 """缓存服务模块 - 提供图片和视频的下载、缓存和清理功能"""
 
+import os
+import time
 import asyncio
 import base64
+import tempfile
+import aiofiles
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple
-from curl_cffi.requests import AsyncSession
+from typing import Dict, Optional, Tuple
 
 from app.core.config import setting
 from app.core.logger import logger
 from app.core.retry import async_request_with_retry
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 
 
@@ -19,21 +24,69 @@ MIME_TYPES = {
 }
 DEFAULT_MIME = 'image/jpeg'
 ASSETS_URL = "https://assets.grok.com"
+TMP_SUFFIX = ".tmp"  # 下载中的临时文件后缀
+TMP_MAX_AGE = 3600  # 超过该时长的临时文件视为残留，清理时删除
+
+
+@lru_cache(maxsize=16384)
+def _cache_name(file_path: str) -> str:
+    """文件路径转缓存文件名"""
+    return file_path.lstrip('/').replace('/', '-')
+
+
+def _mkstemp(path: Path) -> Tuple[int, str]:
+    """在缓存文件同目录创建临时文件（保证 os.replace 不跨文件系统）"""
+    return tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=TMP_SUFFIX)
+
+
+def _discard(tmp: str) -> None:
+    """删除写入失败的临时文件"""
+    try:
+        os.unlink(tmp)
+    except OSError:
+        pass
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """写入同目录临时文件后 os.replace，读取方只会看到完整文件"""
+    fd, tmp = _mkstemp(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+
+
+async def _stream_atomic(response, path: Path) -> None:
+    """边接收边写入临时文件，完成后 os.replace（大文件不整体驻留内存）"""
+    fd, tmp = _mkstemp(path)
+    try:
+        async with aiofiles.open(fd, "wb") as f:
+            async for chunk in response.aiter_content():
+                await f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
 
 
 class CacheService:
     """缓存服务基类"""
 
-    def __init__(self, cache_type: str, timeout: float = 30.0):
+    def __init__(self, cache_type: str, timeout: float = 30.0, stream: bool = False):
         self.cache_type = cache_type
+        self.stream = stream  # 是否流式写盘（视频等大文件）
         self.cache_dir = Path(f"data/temp/{cache_type}")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.timeout = timeout
         self._cleanup_lock = asyncio.Lock()
+        self._inflight: Dict[Path, asyncio.Future] = {}  # 进行中的下载（按缓存路径去重）
 
     def _get_path(self, file_path: str) -> Path:
         """转换文件路径为缓存路径"""
-        return self.cache_dir / file_path.lstrip('/').replace('/', '-')
+        return self.cache_dir / _cache_name(file_path)
 
     def _log(self, level: str, msg: str):
         """统一日志输出"""
@@ -55,39 +108,66 @@ class CacheService:
         }
 
     async def download(self, file_path: str, auth_token: str, timeout: Optional[float] = None) -> Optional[Path]:
-        """下载并缓存文件"""
+        """下载并缓存文件（同一路径并发调用只下载一次，其余等待同一结果）"""
         cache_path = self._get_path(file_path)
-        if cache_path.exists():
+        if (pending := self._inflight.get(cache_path)) is not None:
+            self._log("debug", "等待进行中的下载")
+            return await asyncio.shield(pending)
+
+        # 跳过下载前实时 stat；空文件视为未缓存，重新下载
+        stat_result = self.get_stat(cache_path)
+        if stat_result and stat_result.st_size:
             self._log("debug", "文件已缓存")
             return cache_path
 
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_path] = future
+        result = None
+        try:
+            result = await self._fetch(file_path, cache_path, auth_token, timeout)
+            return result
+        finally:
+            # 发起方被取消时等待方拿到 None，不传播取消
+            self._inflight.pop(cache_path, None)
+            future.set_result(result)
+
+    async def _fetch(self, file_path: str, cache_path: Path, auth_token: str, timeout: Optional[float]) -> Optional[Path]:
+        """从 assets.grok.com 下载文件并原子写入缓存"""
         log_prefix = f"[{self.cache_type.upper()}Cache]"
 
-        async def do_request(proxy, retry_info):
-            proxies = {"http": proxy, "https": proxy} if proxy else {}
+        async def do_request(proxy, outer_retry, retry_403_count):
+            proxies = build_proxies(proxy)
 
-            if proxy and retry_info["outer_retry"] == 0 and retry_info["retry_403_count"] == 0:
+            if proxy and outer_retry == 0 and retry_403_count == 0:
                 self._log("debug", f"使用代理: {proxy.split('@')[-1] if '@' in proxy else proxy}")
 
-            async with AsyncSession() as session:
-                url = f"{ASSETS_URL}{file_path}"
-                if retry_info["outer_retry"] == 0 and retry_info["retry_403_count"] == 0:
-                    self._log("debug", f"下载: {url}")
-
-                response = await session.get(
-                    url,
-                    headers=self._build_headers(file_path, auth_token),
-                    proxies=proxies,
-                    timeout=timeout or self.timeout,
-                    allow_redirects=True,
-                    impersonate="chrome133a"
-                )
+            session = get_session()
+            url = f"{ASSETS_URL}{file_path}"
+            if outer_retry == 0 and retry_403_count == 0:
+                self._log("debug", f"下载: {url}")
+
+            response = await session.get(
+                url,
+                headers=self._build_headers(file_path, auth_token),
+                proxies=proxies,
+                timeout=timeout or self.timeout,
+                allow_redirects=True,
+                impersonate="chrome133a",
+                stream=self.stream
+            )
 
+            try:
                 if response.status_code != 200:
                     return {"status_code": response.status_code}
 
-                await asyncio.to_thread(cache_path.write_bytes, response.content)
+                if self.stream:
+                    await _stream_atomic(response, cache_path)
+                else:
+                    await asyncio.to_thread(_write_atomic, cache_path, response.content)
                 return cache_path
+            finally:
+                if self.stream:
+                    await response.aclose()
 
         try:
             result = await async_request_with_retry(
@@ -108,10 +188,23 @@ class CacheService:
             self._log("error", f"下载失败: {e}")
             return None
 
+    @staticmethod
+    def get_stat(path: Path) -> Optional[os.stat_result]:
+        """获取缓存文件的 stat（不跨请求缓存，文件不存在返回 None）"""
+        try:
+            return path.stat()
+        except OSError:
+            return None
+
+    def lookup(self, file_path: str) -> Tuple[Path, Optional[os.stat_result]]:
+        """一次 stat 同时完成存在性判断并取得 stat_result（供 FileResponse 复用）"""
+        path = self._get_path(file_path)
+        return path, self.get_stat(path)
+
     def get_cached(self, file_path: str) -> Optional[Path]:
         """获取已缓存的文件"""
-        path = self._get_path(file_path)
-        return path if path.exists() else None
+        path, stat_result = self.lookup(file_path)
+        return path if stat_result else None
 
     async def _safe_cleanup(self):
         """安全清理（捕获异常）"""
@@ -130,9 +223,18 @@ class CacheService:
                 max_mb = setting.global_config.get(f"{self.cache_type}_cache_max_size_mb", 500)
                 max_bytes = max_mb * 1024 * 1024
 
-                # 获取文件信息 (path, size, mtime)
-                files = [(f, (s := f.stat()).st_size, s.st_mtime) 
-                        for f in self.cache_dir.glob("*") if f.is_file()]
+                # 获取文件信息 (path, size, mtime)，下载中的临时文件不参与清理
+                files = []
+                now = time.time()
+                for f in self.cache_dir.glob("*"):
+                    if not f.is_file():
+                        continue
+                    s = f.stat()
+                    if f.name.endswith(TMP_SUFFIX):
+                        if now - s.st_mtime > TMP_MAX_AGE:
+                            await asyncio.to_thread(f.unlink, missing_ok=True)
+                        continue
+                    files.append((f, s.st_size, s.st_mtime))
                 total = sum(size for _, size, _ in files)
 
                 if total <= max_bytes:
@@ -202,7 +304,7 @@ class VideoCache(CacheService):
     """视频缓存服务"""
 
     def __init__(self):
-        super().__init__("video", timeout=60.0)
+        super().__init__("video", timeout=60.0, stream=True)
 
     async def download_video(self, path: str, token: str) -> Optional[Path]:
         """下载视频"""
@@ -1,15 +1,20 @@
 """Grok API 客户端 - 处理OpenAI到Grok的请求转换和响应处理"""
 
 import asyncio
+import re
+import time
 import orjson
-from typing import Dict, List, Tuple, Any, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Any, Optional
 from curl_cffi.requests import AsyncSession as curl_AsyncSession
+from curl_cffi.requests.exceptions import RequestException
 
 from app.core.config import setting
 from app.core.logger import logger
-from app.core.retry import async_request_with_retry
+from app.core.retry import async_request_with_retry, get_retry_codes
 from app.models.grok_models import Models
-from app.services.grok.processer import GrokResponseProcessor
+from app.services.grok.processer import GrokResponseProcessor, spawn_background
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 from app.services.grok.token import token_manager
 from app.services.grok.upload import ImageUploadManager
@@ -23,24 +28,147 @@ TIMEOUT = 120
 BROWSER = "chrome133a"
 MAX_RETRY = 3
 MAX_UPLOADS = 20  # 提高并发上传限制以支持更高并发
+UPLOAD_TIMEOUT = 60  # 单张图片上传（含重试）总超时，秒
+BG_WORKERS = 4  # 后台任务工作协程数（限额查询为网络请求，避免队头阻塞）
+BG_QUEUE_SIZE = 10000
+NSFW_FAIL_TTL = 300  # NSFW 开启失败后的冷却时间（秒），期间不再重复调用
+
+# 内容审核标记（大小写不敏感，按字节匹配错误响应体）
+_MOD_RE = re.compile(rb"content[-_]moderated", re.IGNORECASE)
+
+# 角色映射
+_ROLE_MAP = {
+    "system": "系统",
+    "user": "用户",
+    "assistant": "grok",
+    "tool": "工具",
+    "developer": "系统"
+}
+
+# 标准载荷模板（None 为每次请求覆盖的字段，占位以保持键顺序；容器只读共享）
+_STD_PAYLOAD_TEMPLATE = {
+    "temporary": None,
+    "modelName": None,
+    "message": None,
+    "fileAttachments": None,
+    "imageAttachments": (),
+    "disableSearch": False,
+    "enableImageGeneration": True,
+    "returnImageBytes": False,
+    "returnRawGrokInXaiRequest": False,
+    "enableImageStreaming": True,
+    "imageGenerationCount": 2,
+    "forceConcise": False,
+    "toolOverrides": {},
+    "enableSideBySide": True,
+    "sendFinalMetadata": True,
+    "isReasoning": False,
+    "webpageUrls": (),
+    "disableTextFollowUps": True,
+    "responseMetadata": None,
+    "disableMemory": False,
+    "forceSideBySide": False,
+    "modelMode": None,
+    "isAsyncChat": False
+}
+
+
+@lru_cache(maxsize=4096)
+def _sso(auth_token: str) -> Optional[str]:
+    """提取 token 的 SSO 值（按 token 缓存）"""
+    return token_manager._extract_sso(auth_token)
+
+
+def _upload_limit() -> int:
+    """读取上传并发上限（配置不可用时使用默认值）"""
+    return setting.global_config.get("max_upload_concurrency", MAX_UPLOADS)
+
+
+class _DynamicLimiter:
+    """动态并发限制器 - Condition + 计数器，上限每次从 get_max 读取"""
+
+    def __init__(self, get_max):
+        self.active = 0
+        self.get_max = get_max
+        self._cond = asyncio.Condition(asyncio.Lock())
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.get_max())
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify(1)
+
+    async def refresh(self) -> None:
+        """上限变更后唤醒所有等待者重新判断（调低时由释放自然收敛）"""
+        async with self._cond:
+            self._cond.notify_all()
 
 
 class GrokClient:
     """Grok API 客户端"""
 
-    _upload_sem = None  # 延迟初始化
+    _upload_sem: Optional[_DynamicLimiter] = None  # 延迟初始化
     _nsfw_enabled_tokens: set = set()  # 本次运行已开启NSFW的token
+    _nsfw_failed: Dict[str, float] = {}  # 开启失败的token -> 失败时间（负缓存）
+    _nsfw_locks: Dict[str, list] = {}  # 按token串行化NSFW开启: token -> [Lock, 使用者计数]
+    _bg_pending: set = set()  # 已排队或执行中的后台任务键（去重）
+    _bg_queue: Optional[asyncio.Queue] = None  # 后台任务队列（延迟初始化）
+    _bg_workers: List[asyncio.Task] = []
 
     @staticmethod
-    def _get_upload_semaphore():
-        """获取上传信号量（动态配置）"""
+    def _get_upload_semaphore() -> _DynamicLimiter:
+        """获取上传并发限制器（上限随配置热更新）"""
         if GrokClient._upload_sem is None:
-            # 从配置读取，如果不可用则使用默认值
-            max_concurrency = setting.global_config.get("max_upload_concurrency", MAX_UPLOADS)
-            GrokClient._upload_sem = asyncio.Semaphore(max_concurrency)
-            logger.debug(f"[Client] 初始化上传并发限制: {max_concurrency}")
+            GrokClient._upload_sem = _DynamicLimiter(_upload_limit)
+            logger.debug(f"[Client] 初始化上传并发限制: {_upload_limit()}")
         return GrokClient._upload_sem
 
+    @staticmethod
+    def _spawn_once(key: Tuple, coro_fn, *args) -> None:
+        """提交后台任务到工作队列；同键任务已排队或执行中时直接合并"""
+        if key in GrokClient._bg_pending:
+            return
+        if GrokClient._bg_queue is None:
+            GrokClient._bg_queue = asyncio.Queue(maxsize=BG_QUEUE_SIZE)
+            GrokClient._bg_workers = [asyncio.create_task(GrokClient._bg_worker()) for _ in range(BG_WORKERS)]
+        try:
+            GrokClient._bg_queue.put_nowait((key, coro_fn, args))
+        except asyncio.QueueFull:
+            # 队列满时退化为独立任务（持有引用并记录异常）
+            spawn_background(coro_fn(*args))
+            return
+        GrokClient._bg_pending.add(key)
+
+    @staticmethod
+    async def _bg_worker():
+        """后台工作协程：串行执行队列中的任务"""
+        queue = GrokClient._bg_queue
+        while True:
+            key, coro_fn, args = await queue.get()
+            try:
+                await coro_fn(*args)
+            except Exception as e:
+                logger.error(f"[Client] 后台任务失败: {e}")
+            finally:
+                GrokClient._bg_pending.discard(key)
+                queue.task_done()
+
+    @staticmethod
+    async def shutdown_background() -> None:
+        """停止后台工作协程（未执行的任务直接丢弃）"""
+        workers, GrokClient._bg_workers = GrokClient._bg_workers, []
+        for task in workers:
+            task.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        GrokClient._bg_queue = None
+        GrokClient._bg_pending.clear()
+
     @staticmethod
     async def openai_to_grok(request: dict):
         """转换OpenAI请求为Grok请求"""
@@ -74,17 +202,21 @@ class GrokClient:
                 else:
                     token = await token_manager.get_token(model)
 
-                # 主动开启NSFW（仅首次）
-                if setting.grok_config.get("auto_nsfw", False) and token not in GrokClient._nsfw_enabled_tokens:
-                    await GrokClient._auto_enable_nsfw(token)
-                    GrokClient._nsfw_enabled_tokens.add(token)
+                # 主动开启NSFW（仅首次），与图片上传/视频会话创建并行，发送对话前完成
+                nsfw_task = None
+                if setting.grok_config.get("auto_nsfw", False) and GrokClient._nsfw_needed(token):
+                    nsfw_task = asyncio.create_task(GrokClient._ensure_nsfw(token))
 
-                img_ids, img_uris = await GrokClient._upload(images, token)
+                try:
+                    img_ids, img_uris = await GrokClient._upload(images, token)
 
-                # 视频模型创建会话
-                post_id = None
-                if is_video and img_ids and img_uris:
-                    post_id = await GrokClient._create_post(img_ids[0], img_uris[0], token)
+                    # 视频模型创建会话
+                    post_id = None
+                    if is_video and img_ids and img_uris:
+                        post_id = await GrokClient._create_post(img_ids[0], img_uris[0], token)
+                finally:
+                    if nsfw_task:
+                        await nsfw_task
 
                 payload = GrokClient._build_payload(content, grok_model, mode, img_ids, img_uris, is_video, post_id)
                 result = await GrokClient._request(payload, token, model, stream, post_id)
@@ -101,7 +233,7 @@ class GrokClient:
                 # 内容审核: 自动开启 NSFW 并用同一 token 重试
                 if e.error_code == "CONTENT_MODERATED":
                     logger.warning(f"[Client] 内容审核触发, 自动开启NSFW, 重试 {i+1}/{MAX_RETRY}")
-                    await GrokClient._auto_enable_nsfw(token)
+                    await GrokClient._ensure_nsfw(token)
                     force_token = token
                     if i < MAX_RETRY - 1:
                         await asyncio.sleep(0.5)
@@ -112,9 +244,7 @@ class GrokClient:
                     raise
 
                 status = e.context.get("status") if e.context else None
-                retry_codes = setting.grok_config.get("retry_status_codes", [401, 429])
-
-                if status not in retry_codes:
+                if status not in get_retry_codes():
                     raise
 
                 if i < MAX_RETRY - 1:
@@ -124,44 +254,40 @@ class GrokClient:
         raise last_err or GrokApiException("请求失败", "REQUEST_ERROR")
 
     @staticmethod
-    def _extract_content(messages: List[Dict]) -> Tuple[str, List[str]]:
-        """提取文本和图片，保留角色结构"""
-        formatted_messages = []
+    def _extract_content(messages: Iterable[Dict]) -> Tuple[str, List[str]]:
+        """提取文本和图片，保留角色结构（单次遍历，可接受任意可迭代对象）"""
+        if not messages:
+            return "", []
+
+        out = []
         images = []
 
-        # 角色映射
-        role_map = {
-            "system": "系统",
-            "user": "用户",
-            "assistant": "grok",
-            "tool": "工具",
-            "developer": "系统"
-        }
-        
         for msg in messages:
-            role = msg.get("role", "user")
             content = msg.get("content", "")
-            role_prefix = role_map.get(role, role)
-            
-            # 提取文本内容
-            text_parts = []
+
+            # 提取文本内容（纯文本消息无需中间列表）
             if isinstance(content, list):
+                parts = []
                 for item in content:
-                    if item.get("type") == "text":
-                        text_parts.append(item.get("text", ""))
-                    elif item.get("type") == "image_url":
+                    if not isinstance(item, dict):
+                        continue
+                    item_type = item.get("type")
+                    if item_type == "text":
+                        parts.append(item.get("text", ""))
+                    elif item_type == "image_url":
                         if url := item.get("image_url", {}).get("url"):
                             images.append(url)
+                text = "".join(parts).strip()
             else:
-                text_parts.append(content)
-            
-            # 合并该消息的文本并添加角色前缀
-            msg_text = "".join(text_parts).strip()
-            if msg_text:
-                formatted_messages.append(f"{role_prefix}：{msg_text}")
-        
+                text = content.strip() if content else ""
+
+            # 添加角色前缀
+            if text:
+                role = msg.get("role", "user")
+                out.append(f"{_ROLE_MAP.get(role, role)}：{text}")
+
         # 用换行符连接所有消息
-        return "\n".join(formatted_messages), images
+        return "\n".join(out), images
 
     @staticmethod
     async def _upload(urls: List[str], token: str) -> Tuple[List[str], List[str]]:
@@ -171,14 +297,16 @@ class GrokClient:
         
         async def upload_limited(url):
             async with GrokClient._get_upload_semaphore():
-                return await ImageUploadManager.upload(url, token)
+                # 单张上传超时，避免个别慢上传拖住整个请求
+                return await asyncio.wait_for(ImageUploadManager.upload(url, token), timeout=UPLOAD_TIMEOUT)
         
         results = await asyncio.gather(*[upload_limited(u) for u in urls], return_exceptions=True)
         
         ids, uris = [], []
         for url, result in zip(urls, results):
             if isinstance(result, Exception):
-                logger.warning(f"[Client] 上传失败: {url} - {result}")
+                reason = "超时" if isinstance(result, asyncio.TimeoutError) else result
+                logger.warning(f"[Client] 上传失败: {url[:100]} - {reason}")
             elif isinstance(result, tuple) and len(result) == 2:
                 fid, furi = result
                 if fid:
@@ -212,32 +340,15 @@ class GrokClient:
                 "toolOverrides": {"videoGen": True}
             }
         
-        # 标准载荷
-        return {
-            "temporary": setting.grok_config.get("temporary", True),
-            "modelName": model,
-            "message": content,
-            "fileAttachments": img_ids,
-            "imageAttachments": [],
-            "disableSearch": False,
-            "enableImageGeneration": True,
-            "returnImageBytes": False,
-            "returnRawGrokInXaiRequest": False,
-            "enableImageStreaming": True,
-            "imageGenerationCount": 2,
-            "forceConcise": False,
-            "toolOverrides": {},
-            "enableSideBySide": True,
-            "sendFinalMetadata": True,
-            "isReasoning": False,
-            "webpageUrls": [],
-            "disableTextFollowUps": True,
-            "responseMetadata": {"requestModelDetails": {"modelId": model}},
-            "disableMemory": False,
-            "forceSideBySide": False,
-            "modelMode": mode,
-            "isAsyncChat": False
-        }
+        # 标准载荷：复制模板后仅覆盖可变字段
+        p = _STD_PAYLOAD_TEMPLATE.copy()
+        p["temporary"] = setting.grok_config.get("temporary", True)
+        p["modelName"] = model
+        p["message"] = content
+        p["fileAttachments"] = img_ids
+        p["responseMetadata"] = {"requestModelDetails": {"modelId": model}}
+        p["modelMode"] = mode
+        return p
 
     @staticmethod
     async def _request(payload: dict, token: str, model: str, stream: bool, post_id: str = None):
@@ -248,8 +359,8 @@ class GrokClient:
         # 保存session引用，流式时不关闭
         _session_holder = {}
 
-        async def do_request(proxy, retry_info):
-            proxies = {"http": proxy, "https": proxy} if proxy else None
+        async def do_request(proxy, outer_retry, retry_403_count):
+            proxies = build_proxies(proxy)
 
             headers = GrokClient._build_headers(token)
             if model == "grok-imagine-0.9":
@@ -258,23 +369,31 @@ class GrokClient:
                 if ref_id:
                     headers["Referer"] = f"https://grok.com/imagine/{ref_id}"
 
-            session = curl_AsyncSession(impersonate=BROWSER)
+            # 非流式复用共享会话（连接池/TLS 复用）；流式使用独立会话，由生成器负责关闭
+            session = curl_AsyncSession(impersonate=BROWSER) if stream else get_session()
             try:
                 response = await session.post(
                     API_ENDPOINT,
                     headers=headers,
                     data=orjson.dumps(payload),
+                    impersonate=BROWSER,
                     timeout=TIMEOUT,
                     stream=True,
                     proxies=proxies
                 )
 
                 if response.status_code != 200:
-                    await session.close()
+                    # 读完错误响应体以释放连接（流式模式下 content 默认为空），供 _handle_error 解析
+                    try:
+                        response.content = await response.acontent()
+                    except Exception:
+                        pass
+                    if stream:
+                        await session.close()
                     return {"status_code": response.status_code, "response": response}
 
                 # 成功
-                asyncio.create_task(token_manager.reset_failure(token))
+                GrokClient._spawn_once(("reset", token), token_manager.reset_failure, token)
 
                 if stream:
                     _session_holder["session"] = session
@@ -283,20 +402,24 @@ class GrokClient:
                     try:
                         result = await GrokResponseProcessor.process_normal(response, token, model)
                     finally:
-                        await session.close()
+                        # 中止未读完的传输并等待句柄归还共享会话
+                        response.close()
+                        await response.aclose()
                     _session_holder["result"] = result
 
                 return "SUCCESS"
 
             except GrokApiException as e:
-                await session.close()
+                if stream:
+                    await session.close()
                 if e.error_code == "CONTENT_MODERATED":
                     # 内容审核不需要重试，直接返回特殊标记让上层处理
                     return {"content_moderated": True, "exception": e}
                 raise
             except Exception as e:
-                await session.close()
-                if "RequestsError" in str(type(e)):
+                if stream:
+                    await session.close()
+                if isinstance(e, RequestException):
                     raise GrokApiException(f"网络错误: {e}", "NETWORK_ERROR") from e
                 raise
 
@@ -314,7 +437,7 @@ class GrokClient:
             raise GrokApiException("请求失败：已达到最大重试次数", "MAX_RETRIES_EXCEEDED")
 
         # 成功路径
-        asyncio.create_task(GrokClient._update_limits(token, model))
+        GrokClient._spawn_once(("limits", token, model), GrokClient._update_limits, token, model)
 
         if stream:
             return GrokResponseProcessor.process_stream(
@@ -333,35 +456,70 @@ class GrokClient:
             if e.error_code != "CONTENT_MODERATED":
                 raise
             logger.warning("[Client] 流式响应内容审核, 自动开启NSFW并重试")
-            await GrokClient._auto_enable_nsfw(token)
+            await GrokClient._ensure_nsfw(token)
             await asyncio.sleep(0.5)
             new_stream = await GrokClient._request(payload, token, model, True, post_id)
             async for chunk in new_stream:
                 yield chunk
 
     @staticmethod
-    async def _auto_enable_nsfw(auth_token: str):
-        """自动开启 NSFW 模式"""
+    def _nsfw_needed(token: str) -> bool:
+        """token 是否需要尝试开启 NSFW（已开启或处于失败冷却期时跳过）"""
+        if token in GrokClient._nsfw_enabled_tokens:
+            return False
+        failed_at = GrokClient._nsfw_failed.get(token)
+        return failed_at is None or time.monotonic() - failed_at >= NSFW_FAIL_TTL
+
+    @staticmethod
+    async def _ensure_nsfw(token: str):
+        """为 token 开启 NSFW（同一 token 并发请求只调用一次；失败后冷却期内不重试）"""
+        if not GrokClient._nsfw_needed(token):
+            return
+        entry = GrokClient._nsfw_locks.get(token)
+        if entry is None:
+            entry = GrokClient._nsfw_locks[token] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                # 等锁期间可能已由其他请求完成或失败
+                if not GrokClient._nsfw_needed(token):
+                    return
+                if await GrokClient._auto_enable_nsfw(token):
+                    GrokClient._nsfw_enabled_tokens.add(token)
+                    GrokClient._nsfw_failed.pop(token, None)
+                else:
+                    GrokClient._nsfw_failed[token] = time.monotonic()
+        finally:
+            # 最后一个使用者离开时才移除锁，避免等待者各自新建锁重复调用
+            entry[1] -= 1
+            if not entry[1]:
+                GrokClient._nsfw_locks.pop(token, None)
+
+    @staticmethod
+    async def _auto_enable_nsfw(auth_token: str) -> bool:
+        """自动开启 NSFW 模式，返回是否成功"""
         try:
             from app.services.grok.nsfw import enable_nsfw
-            sso = token_manager._extract_sso(auth_token)
+            sso = _sso(auth_token)
             if sso:
                 result = await enable_nsfw(sso)
                 if result.get("success"):
                     logger.info(f"[Client] 自动开启NSFW成功: {sso[:10]}...")
+                    return True
                 else:
                     logger.warning(f"[Client] 自动开启NSFW失败: {result.get('error', '未知')}")
             else:
                 logger.warning("[Client] 无法提取SSO值, 跳过NSFW开启")
         except Exception as e:
             logger.warning(f"[Client] 自动开启NSFW异常: {e}")
+        return False
 
     @staticmethod
     def _build_headers(token: str) -> Dict[str, str]:
         """构建请求头"""
         headers = get_dynamic_headers("/rest/app-chat/conversations/new")
         cf = setting.grok_config.get("cf_clearance", "")
-        headers["Cookie"] = f"{token};{cf}" if cf else token
+        headers["Cookie"] = token + ";" + cf if cf else token
         return headers
 
     @staticmethod
@@ -373,16 +531,15 @@ class GrokClient:
             logger.warning(f"[Client] {msg}")
         else:
             try:
-                data = response.json()
+                data = orjson.loads(response.content)
                 msg = str(data)
-            except:
+            except orjson.JSONDecodeError:
                 data = response.text
                 msg = data[:200] if data else "未知错误"
 
-        # 检测内容审核（可能来自非200响应体）
-        error_code = "HTTP_ERROR"
-        if "content-moderated" in str(msg).lower():
-            error_code = "CONTENT_MODERATED"
+        # 检测内容审核（可能来自非200响应体，直接扫描原始字节）
+        raw = response.content if response.status_code != 403 else b""
+        error_code = "CONTENT_MODERATED" if raw and _MOD_RE.search(raw) else "HTTP_ERROR"
 
         asyncio.create_task(token_manager.record_failure(token, response.status_code, msg))
         asyncio.create_task(token_manager.apply_cooldown(token, response.status_code))
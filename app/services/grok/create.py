@@ -3,8 +3,8 @@
 import asyncio
 import orjson
 from typing import Dict, Any, Optional
-from curl_cffi.requests import AsyncSession
 
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 from app.core.exception import GrokApiException
 from app.core.config import setting
@@ -71,67 +71,67 @@ class PostCreateManager:
                     else:
                         proxy = await setting.get_proxy_async("service")
                     
-                    proxies = {"http": proxy, "https": proxy} if proxy else None
+                    proxies = build_proxies(proxy)
 
                     # 发送请求
-                    async with AsyncSession() as session:
-                        response = await session.post(
-                            ENDPOINT,
-                            headers=headers,
-                            json=data,
-                            impersonate=BROWSER,
-                            timeout=TIMEOUT,
-                            proxies=proxies
-                        )
+                    session = get_session()
+                    response = await session.post(
+                        ENDPOINT,
+                        headers=headers,
+                        json=data,
+                        impersonate=BROWSER,
+                        timeout=TIMEOUT,
+                        proxies=proxies
+                    )
 
-                        # 内层403重试：仅当有代理池时触发
-                        if response.status_code == 403 and proxy_pool._enabled:
-                            retry_403_count += 1
-                            
-                            if retry_403_count <= max_403_retries:
-                                logger.warning(f"[PostCreate] 遇到403错误，正在重试 ({retry_403_count}/{max_403_retries})...")
-                                await asyncio.sleep(0.5)
-                                continue
-                            
-                            # 内层重试全部失败
-                            logger.error(f"[PostCreate] 403错误，已重试{retry_403_count-1}次，放弃")
+                    # 内层403重试：仅当有代理池时触发
+                    if response.status_code == 403 and proxy_pool._enabled:
+                        retry_403_count += 1
                         
-                        # 检查可配置状态码错误 - 外层重试
-                        if response.status_code in retry_codes:
-                            if outer_retry < MAX_OUTER_RETRY:
-                                delay = (outer_retry + 1) * 0.1  # 渐进延迟：0.1s, 0.2s, 0.3s
-                                logger.warning(f"[PostCreate] 遇到{response.status_code}错误，外层重试 ({outer_retry+1}/{MAX_OUTER_RETRY})，等待{delay}s...")
-                                await asyncio.sleep(delay)
-                                break  # 跳出内层循环，进入外层重试
-                            else:
-                                logger.error(f"[PostCreate] {response.status_code}错误，已重试{outer_retry}次，放弃")
-                                raise GrokApiException(f"创建失败: {response.status_code}错误", "CREATE_ERROR")
+                        if retry_403_count <= max_403_retries:
+                            logger.warning(f"[PostCreate] 遇到403错误，正在重试 ({retry_403_count}/{max_403_retries})...")
+                            await asyncio.sleep(0.5)
+                            continue
+                        
+                        # 内层重试全部失败
+                        logger.error(f"[PostCreate] 403错误，已重试{retry_403_count-1}次，放弃")
+                    
+                    # 检查可配置状态码错误 - 外层重试
+                    if response.status_code in retry_codes:
+                        if outer_retry < MAX_OUTER_RETRY:
+                            delay = (outer_retry + 1) * 0.1  # 渐进延迟：0.1s, 0.2s, 0.3s
+                            logger.warning(f"[PostCreate] 遇到{response.status_code}错误，外层重试 ({outer_retry+1}/{MAX_OUTER_RETRY})，等待{delay}s...")
+                            await asyncio.sleep(delay)
+                            break  # 跳出内层循环，进入外层重试
+                        else:
+                            logger.error(f"[PostCreate] {response.status_code}错误，已重试{outer_retry}次，放弃")
+                            raise GrokApiException(f"创建失败: {response.status_code}错误", "CREATE_ERROR")
 
-                        if response.status_code == 200:
-                            result = response.json()
-                            post_id = result.get("post", {}).get("id", "")
-                            
-                            if outer_retry > 0 or retry_403_count > 0:
-                                logger.info(f"[PostCreate] 重试成功！")
-                            
-                            logger.debug(f"[PostCreate] 成功，会话ID: {post_id}")
-                            return {
-                                "post_id": post_id,
-                                "file_id": file_id,
-                                "file_uri": file_uri,
-                                "success": True,
-                                "data": result
-                            }
+                    if response.status_code == 200:
+                        result = response.json()
+                        post_id = result.get("post", {}).get("id", "")
                         
-                        # 其他错误处理
-                        try:
-                            error = response.json()
-                            msg = f"状态码: {response.status_code}, 详情: {error}"
-                        except:
-                            msg = f"状态码: {response.status_code}, 详情: {response.text[:200]}"
+                        if outer_retry > 0 or retry_403_count > 0:
+                            logger.info(f"[PostCreate] 重试成功！")
                         
-                        logger.error(f"[PostCreate] 失败: {msg}")
-                        raise GrokApiException(f"创建失败: {msg}", "CREATE_ERROR")
+                        logger.debug(f"[PostCreate] 成功，会话ID: {post_id}")
+                        return {
+                            "post_id": post_id,
+                            "file_id": file_id,
+                            "file_uri": file_uri,
+                            "success": True,
+                            "data": result
+                        }
+                    
+                    # 其他错误处理
+                    try:
+                        error = orjson.loads(response.content)
+                        msg = f"状态码: {response.status_code}, 详情: {error}"
+                    except orjson.JSONDecodeError:
+                        msg = f"状态码: {response.status_code}, 详情: {response.text[:200]}"
+                    
+                    logger.error(f"[PostCreate] 失败: {msg}")
+                    raise GrokApiException(f"创建失败: {msg}", "CREATE_ERROR")
 
         except GrokApiException:
             raise
@@ -1,61 +1,70 @@
 """NSFW 模式服务模块 - 通过 gRPC-Web 调用 Grok AuthManagement API 开启 Unhinged 模式"""
 
+import asyncio
 import struct
 from typing import Dict, Tuple
 from urllib.parse import unquote
 
-from curl_cffi.requests import AsyncSession
-
 from app.core.config import setting
 from app.core.logger import logger
-from app.core.retry import async_request_with_retry
+from app.core.retry import backoff, is_transient
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 
 
 NSFW_API = "https://grok.com/auth_mgmt.AuthManagement/UpdateUserFeatureControls"
 BROWSER = "chrome133a"
+MAX_ATTEMPTS = 2
+
+# gRPC-Web 帧头中的 4 字节 big-endian 长度
+_HDR = struct.Struct(">I")
+
+# 固定请求头（Cookie 为每次调用覆盖的占位，保持请求头顺序）
+_NSFW_HEADERS_BASE = {
+    "Content-Type": "application/grpc-web+proto",
+    "x-grpc-web": "1",
+    "Cookie": "",
+    "Accept": "*/*",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Origin": "https://grok.com",
+    "Referer": "https://grok.com/",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+}
 
 
 # --- gRPC-Web 编解码 ---
 
 def _encode_grpc_web_payload(data: bytes) -> bytes:
     """编码 gRPC-Web 请求 payload（5字节帧头 + 数据）"""
-    frame = bytearray(5 + len(data))
-    frame[0] = 0x00  # flags: 数据帧
-    struct.pack_into(">I", frame, 1, len(data))  # 4字节 big-endian 长度
-    frame[5:] = data
-    return bytes(frame)
+    return b"\x00" + _HDR.pack(len(data)) + data  # flags: 数据帧
 
 
 def _parse_grpc_web_response(body: bytes) -> Tuple[list, Dict[str, str]]:
     """解析 gRPC-Web 响应，返回 (messages, trailers)"""
     messages = []
     trailers = {}
+    mv = memoryview(body)
+    size = len(mv)
     offset = 0
 
-    while offset < len(body):
-        if offset + 5 > len(body):
-            break
-        flags = body[offset]
-        length = struct.unpack_from(">I", body, offset + 1)[0]
+    while offset + 5 <= size:
+        flags = mv[offset]
+        length = _HDR.unpack_from(mv, offset + 1)[0]
         offset += 5
-        if offset + length > len(body):
+        end = offset + length
+        if end > size:
             break
 
-        data = body[offset:offset + length]
-        offset += length
-
-        if flags == 0x80:
-            # Trailer 帧
-            text = data.decode("utf-8", errors="replace")
-            for line in text.split("\r\n"):
-                idx = line.find(":")
+        if flags & 0x80:
+            # Trailer 帧：按字节拆分，仅对键值解码
+            for line in mv[offset:end].tobytes().split(b"\r\n"):
+                idx = line.find(b":")
                 if idx > 0:
-                    key = line[:idx].strip().lower()
-                    value = line[idx + 1:].strip()
-                    trailers[key] = value
+                    key = line[:idx].strip().lower().decode("utf-8", errors="replace")
+                    trailers[key] = line[idx + 1:].strip().decode("utf-8", errors="replace")
         else:
-            messages.append(data)
+            messages.append(mv[offset:end].tobytes())
+        offset = end
 
     return messages, trailers
 
@@ -95,48 +104,50 @@ async def _call_nsfw_api(sso_token: str, protobuf: bytes, action: str) -> Dict:
 
     dynamic_headers = get_dynamic_headers("/auth_mgmt.AuthManagement/UpdateUserFeatureControls")
 
-    headers = {
-        "Content-Type": "application/grpc-web+proto",
-        "x-grpc-web": "1",
-        "Cookie": f"sso={sso_token}; sso-rw={sso_token}",
-        "Accept": "*/*",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        "Origin": "https://grok.com",
-        "Referer": "https://grok.com/",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-    }
-    if dynamic_headers.get("x-statsig-id"):
-        headers["x-statsig-id"] = dynamic_headers["x-statsig-id"]
-
-    async def do_request(proxy, retry_info):
-        proxies = {"http": proxy, "https": proxy} if proxy else None
-        async with AsyncSession(impersonate=BROWSER) as session:
-            response = await session.post(
-                NSFW_API,
-                headers=headers,
-                content=payload,
-                timeout=30,
-                proxies=proxies,
-            )
-            if response.status_code != 200:
-                return {"status_code": response.status_code}
-
-            body = response.content
-            _, trailers = _parse_grpc_web_response(body)
-            code, message, ok = _get_grpc_status(trailers)
-
-            if ok:
-                return {"success": True, "message": f"NSFW 模式已{action}"}
-            return {"success": False, "message": "gRPC 调用失败", "error": message or f"Code: {code}"}
+    headers = _NSFW_HEADERS_BASE.copy()
+    headers["Cookie"] = f"sso={sso_token}; sso-rw={sso_token}"
+    if statsig_id := dynamic_headers.get("x-statsig-id"):
+        headers["x-statsig-id"] = statsig_id
 
     try:
-        result = await async_request_with_retry(do_request, log_prefix=f"[NSFW-{action}]")
+        proxy = await setting.get_proxy_async("service")
+        proxies = build_proxies(proxy)
+        session = get_session()
+
+        # 仅对 5xx 和传输层异常内联重试一次；认证失败等直接返回
+        for attempt in range(MAX_ATTEMPTS):
+            last = attempt == MAX_ATTEMPTS - 1
+            try:
+                response = await session.post(
+                    NSFW_API,
+                    headers=headers,
+                    data=payload,
+                    impersonate=BROWSER,
+                    timeout=30,
+                    proxies=proxies,
+                )
+            except Exception as e:
+                if last or not is_transient(e):
+                    raise
+                logger.warning(f"[NSFW-{action}] 网络异常，重试: {e}")
+                await asyncio.sleep(backoff(attempt))
+                continue
+
+            if response.status_code >= 500 and not last:
+                logger.warning(f"[NSFW-{action}] 遇到{response.status_code}错误，重试...")
+                await asyncio.sleep(backoff(attempt))
+                continue
+            break
+
+        if response.status_code != 200:
+            return {"success": False, "message": "HTTP 请求失败", "error": f"Status: {response.status_code}"}
 
-        # 重试用尽
-        if isinstance(result, dict) and "status_code" in result and "success" not in result:
-            return {"success": False, "message": "HTTP 请求失败", "error": f"Status: {result['status_code']}"}
+        _, trailers = _parse_grpc_web_response(response.content)
+        code, message, ok = _get_grpc_status(trailers)
 
-        return result
+        if ok:
+            return {"success": True, "message": f"NSFW 模式已{action}"}
+        return {"success": False, "message": "gRPC 调用失败", "error": message or f"Code: {code}"}
 
     except Exception as e:
         logger.error(f"[NSFW] {action}异常: {e}")
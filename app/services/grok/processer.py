@@ -1,26 +1,99 @@
 """Grok API 响应处理器 - 处理流式和非流式响应"""
 
+import re
 import orjson
 import uuid
 import time
 import asyncio
-from typing import AsyncGenerator, Tuple, Any
+from functools import lru_cache
+from typing import AsyncGenerator, Dict, Tuple, Any, Optional
 
 from app.core.config import setting
 from app.core.context import get_base_url
 from app.core.exception import GrokApiException
 from app.core.logger import logger
-from app.models.openai_schema import (
-    OpenAIChatCompletionResponse,
-    OpenAIChatCompletionChoice,
-    OpenAIChatCompletionMessage,
-    OpenAIChatCompletionChunkResponse,
-    OpenAIChatCompletionChunkChoice,
-    OpenAIChatCompletionChunkMessage
-)
 from app.services.grok.cache import image_cache_service, video_cache_service
 
 
+# 常量
+B64_CHUNK_SIZE = 131072  # Base64 图片分块大小（128KB）
+_SSE_DONE = b"data: [DONE]\n\n"  # 流结束帧
+_STRIP_NEWLINES = str.maketrans("", "", "\n")
+
+# Thinking 状态转换表: show_thinking -> {(上一块思考中, 当前块思考中): (内容前缀 或 None 表示跳过, 是否结束思考)}
+_THINK_TRANSITIONS = {
+    True: {
+        (False, False): ("", False),
+        (False, True): ("<think>\n", False),
+        (True, True): ("", False),
+        (True, False): ("\n</think>\n", True),
+    },
+    False: {
+        (False, False): ("", False),
+        (False, True): (None, False),
+        (True, True): (None, False),
+        (True, False): ("", True),
+    },
+}
+
+# 流式处理需要解析的字段（字节级预检，未命中的帧无需 JSON 解析）
+_INTERESTING_KEYS = (
+    b'"token"',
+    b'"error"',
+    b'"modelResponse"',
+    b'"userResponse"',
+    b'"streamingVideoGenerationResponse"',
+    b'"imageAttachmentInfo"',
+    b'"webSearchResults"',
+)
+
+
+@lru_cache(maxsize=8)
+def _compile_filter(filtered_tags: str) -> Optional[re.Pattern]:
+    """将逗号分隔的过滤标签编译为单个正则（按配置字符串缓存，忽略空标签）"""
+    tags = [t for t in filtered_tags.split(",") if t]
+    if not tags:
+        return None
+    return re.compile("|".join(map(re.escape, tags)))
+
+
+# 后台任务（预缓存等；保持强引用，防止任务被回收）
+_background_tasks: set = set()
+
+
+def spawn_background(coro) -> None:
+    """启动后台任务，异常仅记录日志"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+
+
+def _on_background_done(task: asyncio.Task) -> None:
+    """后台任务完成回调"""
+    _background_tasks.discard(task)
+    if not task.cancelled() and (e := task.exception()):
+        logger.warning(f"[Processor] 后台任务失败: {e}")
+
+
+async def _iter_lines(response) -> AsyncGenerator[bytes, None]:
+    """按行迭代上游字节流（bytearray 缓冲，避免跨块拼接和 splitlines 的中间分配）
+
+    行首尾空白（含 CRLF 的 \r）被去除，空行直接跳过。
+    """
+    buf = bytearray()
+    async for raw in response.aiter_content():
+        buf += raw
+        start = 0
+        while (nl := buf.find(b"\n", start)) != -1:
+            if line := bytes(buf[start:nl]).strip():
+                yield line
+            start = nl + 1
+        if start:
+            del buf[:start]
+    if line := bytes(buf).strip():
+        yield line
+
+
 class StreamTimeoutManager:
     """流式响应超时管理"""
     
@@ -28,50 +101,56 @@ class StreamTimeoutManager:
         self.chunk_timeout = chunk_timeout
         self.first_timeout = first_timeout
         self.total_timeout = total_timeout
-        self.start_time = asyncio.get_event_loop().time()
+        self._time = asyncio.get_running_loop().time  # 缓存绑定方法，避免每块查找事件循环
+        self.start_time = self._time()
         self.last_chunk_time = self.start_time
         self.first_received = False
+        # 预计算截止时间
+        self._first_deadline = self.start_time + first_timeout
+        self._total_deadline = self.start_time + total_timeout if total_timeout > 0 else float("inf")
     
-    def check_timeout(self) -> Tuple[bool, str]:
-        """检查超时"""
-        now = asyncio.get_event_loop().time()
-        
-        if not self.first_received and now - self.start_time > self.first_timeout:
-            return True, f"首次响应超时({self.first_timeout}秒)"
-        
-        if self.total_timeout > 0 and now - self.start_time > self.total_timeout:
-            return True, f"总超时({self.total_timeout}秒)"
-        
-        if self.first_received and now - self.last_chunk_time > self.chunk_timeout:
-            return True, f"数据块超时({self.chunk_timeout}秒)"
-        
-        return False, ""
+    def next_wait(self) -> Tuple[float, str]:
+        """距下一个截止时间的剩余秒数及对应超时原因"""
+        if self.first_received:
+            deadline = self.last_chunk_time + self.chunk_timeout
+            reason = f"数据块超时({self.chunk_timeout}秒)"
+        else:
+            deadline = self._first_deadline
+            reason = f"首次响应超时({self.first_timeout}秒)"
+
+        if self._total_deadline < deadline:
+            deadline = self._total_deadline
+            reason = f"总超时({self.total_timeout}秒)"
+
+        return deadline - self._time(), reason
     
     def mark_received(self):
         """标记收到数据"""
-        self.last_chunk_time = asyncio.get_event_loop().time()
+        self.last_chunk_time = self._time()
         self.first_received = True
     
     def duration(self) -> float:
         """获取总耗时"""
-        return asyncio.get_event_loop().time() - self.start_time
+        return self._time() - self.start_time
 
 
 class GrokResponseProcessor:
     """Grok响应处理器"""
 
     @staticmethod
-    def _image_proxy_url(img_path: str) -> str:
-        """构建图片代理 URL（始终通过本地 /images/ 端点，不直接暴露 assets.grok.com）"""
-        base_url = get_base_url()
-        return f"{base_url}/images/{img_path}" if base_url else f"/images/{img_path}"
+    def _image_proxy_url(img_path: str, base_url: str) -> str:
+        """构建图片代理 URL（始终通过本地 /images/ 端点，不直接暴露 assets.grok.com）
+
+        base_url 由调用方每个响应读取一次后传入（为空时为相对路径）。
+        """
+        return f"{base_url}/images/{img_path}"
 
     @staticmethod
-    async def process_normal(response, auth_token: str, model: str = None) -> OpenAIChatCompletionResponse:
+    async def process_normal(response, auth_token: str, model: str = None) -> Dict[str, Any]:
         """处理非流式响应"""
         response_closed = False
         try:
-            async for chunk in response.aiter_lines():
+            async for chunk in _iter_lines(response):
                 if not chunk:
                     continue
 
@@ -131,62 +210,85 @@ class GrokResponseProcessor:
             logger.error(f"[Processor] 处理错误: {type(e).__name__}: {e}")
             raise GrokApiException(f"响应处理错误: {e}", "PROCESS_ERROR") from e
         finally:
-            if not response_closed and hasattr(response, 'close'):
+            close = getattr(response, 'close', None)
+            if not response_closed and close is not None:
                 try:
-                    response.close()
+                    close()
                 except Exception as e:
                     logger.warning(f"[Processor] 关闭响应失败: {e}")
 
     @staticmethod
-    async def process_stream(response, auth_token: str, session: Any = None) -> AsyncGenerator[str, None]:
+    async def process_stream(response, auth_token: str, session: Any = None) -> AsyncGenerator[bytes, None]:
         """处理流式响应"""
+        # 配置在流开始时一次性读取
+        grok_config = setting.grok_config
+
         # 状态变量
         is_image = False
         is_thinking = False
         thinking_finished = False
         model = None
-        filtered_tags = setting.grok_config.get("filtered_tags", "").split(",")
+        filter_re = _compile_filter(grok_config.get("filtered_tags", ""))
         video_progress_started = False
         last_video_progress = -1
         response_closed = False
-        show_thinking = setting.grok_config.get("show_thinking", True)
+        show_thinking = grok_config.get("show_thinking", True)
+        image_mode = setting.global_config.get("image_mode", "url")
+        think_table = _THINK_TRANSITIONS[bool(show_thinking)]
+        base_url = get_base_url()
 
         # 超时管理
         timeout_mgr = StreamTimeoutManager(
-            chunk_timeout=setting.grok_config.get("stream_chunk_timeout", 120),
-            first_timeout=setting.grok_config.get("stream_first_response_timeout", 30),
-            total_timeout=setting.grok_config.get("stream_total_timeout", 600)
+            chunk_timeout=grok_config.get("stream_chunk_timeout", 120),
+            first_timeout=grok_config.get("stream_first_response_timeout", 30),
+            total_timeout=grok_config.get("stream_total_timeout", 600)
         )
 
-        def make_chunk(content: str, finish: str = None):
+        # 响应块模板：逐块原地修改后立即序列化，避免每块构建 Pydantic 模型
+        # id 在整个流中保持不变（与 OpenAI 流式语义一致），created 按上游数据块刷新
+        chunk_tmpl = {
+            "id": f"chatcmpl-{uuid.uuid4()}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": None,
+            "system_fingerprint": None,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": None}]
+        }
+        chunk_choice = chunk_tmpl["choices"][0]
+
+        def make_chunk(content: str, finish: str = None) -> bytes:
             """生成响应块"""
-            chunk_data = OpenAIChatCompletionChunkResponse(
-                id=f"chatcmpl-{uuid.uuid4()}",
-                created=int(time.time()),
-                model=model or "grok-4-mini-thinking-tahoe",
-                choices=[OpenAIChatCompletionChunkChoice(
-                    index=0,
-                    delta=OpenAIChatCompletionChunkMessage(
-                        role="assistant",
-                        content=content
-                    ) if content else {},
-                    finish_reason=finish
-                )]
-            )
-            return f"data: {chunk_data.model_dump_json()}\n\n"
+            chunk_tmpl["model"] = model or "grok-4-mini-thinking-tahoe"
+            chunk_choice["delta"] = {"role": "assistant", "content": content} if content else {}
+            chunk_choice["finish_reason"] = finish
+            return b"data: " + orjson.dumps(chunk_tmpl) + b"\n\n"
 
         try:
-            async for chunk in response.aiter_lines():
-                # 超时检查
-                is_timeout, timeout_msg = timeout_mgr.check_timeout()
-                if is_timeout:
+            lines = _iter_lines(response)
+            while True:
+                # 超时由事件循环计时器触发，成功路径无需逐块检查
+                wait, timeout_msg = timeout_mgr.next_wait()
+                try:
+                    if wait <= 0:
+                        raise asyncio.TimeoutError
+                    chunk = await asyncio.wait_for(lines.__anext__(), timeout=wait)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
                     logger.warning(f"[Processor] {timeout_msg}")
                     yield make_chunk("", "stop")
-                    yield "data: [DONE]\n\n"
+                    yield _SSE_DONE
                     return
 
                 logger.debug(f"[Processor] 收到数据块: {len(chunk)} bytes")
-                if not chunk:
+                # 非 JSON 对象行（keep-alive 等）直接跳过，不进入 JSON 解析
+                if chunk[:1] != b"{":
+                    continue
+
+                # 不含任何关注字段的帧（心跳、元数据等）跳过解析，仅刷新超时
+                if not any(key in chunk for key in _INTERESTING_KEYS):
+                    if b'"response"' in chunk:
+                        timeout_mgr.mark_received()
                     continue
 
                 try:
@@ -200,7 +302,7 @@ class GrokResponseProcessor:
                             raise GrokApiException(f"API错误: {error_msg}", "CONTENT_MODERATED")
                         logger.error(f"[Processor] API错误: {error_msg}")
                         yield make_chunk(f"Error: {error_msg}", "stop")
-                        yield "data: [DONE]\n\n"
+                        yield _SSE_DONE
                         return
 
                     grok_resp = data.get("result", {}).get("response", {})
@@ -209,6 +311,7 @@ class GrokResponseProcessor:
                         continue
                     
                     timeout_mgr.mark_received()
+                    chunk_tmpl["created"] = int(time.time())
 
                     # 更新模型
                     if user_resp := grok_resp.get("userResponse"):
@@ -236,7 +339,7 @@ class GrokResponseProcessor:
                         # 视频URL
                         if v_url:
                             logger.debug("[Processor] 视频生成完成")
-                            video_content = await GrokResponseProcessor._build_video_content(v_url, auth_token)
+                            video_content = await GrokResponseProcessor._build_video_content(v_url, auth_token, base_url)
                             yield make_chunk(video_content)
                         
                         continue
@@ -250,44 +353,53 @@ class GrokResponseProcessor:
                     # 图片处理
                     if is_image:
                         if model_resp := grok_resp.get("modelResponse"):
-                            image_mode = setting.global_config.get("image_mode", "url")
                             content = ""
-
-                            for img in model_resp.get("generatedImageUrls", []):
-                                if not img:
-                                    continue
-                                proxy_url = GrokResponseProcessor._image_proxy_url(img)
-                                try:
-                                    if image_mode == "base64":
-                                        # Base64模式 - 分块发送
-                                        base64_str = await image_cache_service.download_base64(f"/{img}", auth_token)
-                                        if base64_str:
-                                            # 分块发送大数据
-                                            if not base64_str.startswith("data:"):
-                                                parts = base64_str.split(",", 1)
-                                                if len(parts) == 2:
-                                                    yield make_chunk(f"![Generated Image](data:{parts[0]},")
-                                                    # 8KB分块
-                                                    for i in range(0, len(parts[1]), 8192):
-                                                        yield make_chunk(parts[1][i:i+8192])
-                                                    yield make_chunk(")\n")
-                                                else:
-                                                    yield make_chunk(f"![Generated Image]({base64_str})\n")
+                            imgs = [img for img in model_resp.get("generatedImageUrls", []) if img]
+                            paths = [f"/{img}" for img in imgs]
+
+                            if image_mode == "base64":
+                                # 并发下载所有图片，再按原顺序输出
+                                results = await asyncio.gather(
+                                    *(image_cache_service.download_base64(path, auth_token) for path in paths),
+                                    return_exceptions=True
+                                )
+                            else:
+                                # URL模式 - 后台预缓存，不阻塞输出（/images/ 端点未命中时会按需下载）
+                                for path in paths:
+                                    spawn_background(image_cache_service.download_image(path, auth_token))
+                                results = [None] * len(imgs)
+
+                            for img, result in zip(imgs, results):
+                                proxy_url = GrokResponseProcessor._image_proxy_url(img, base_url)
+                                if isinstance(result, Exception):
+                                    logger.warning(f"[Processor] 处理图片失败: {result}")
+                                    content += f"![Generated Image]({proxy_url})\n\n"
+                                elif image_mode == "base64":
+                                    # Base64模式 - 分块发送
+                                    base64_str = result
+                                    if base64_str:
+                                        # 分块发送大数据
+                                        if not base64_str.startswith("data:"):
+                                            parts = base64_str.split(",", 1)
+                                            if len(parts) == 2:
+                                                yield make_chunk(f"![Generated Image](data:{parts[0]},")
+                                                # 大块发送，减少逐帧序列化和写入次数
+                                                for i in range(0, len(parts[1]), B64_CHUNK_SIZE):
+                                                    yield make_chunk(parts[1][i:i + B64_CHUNK_SIZE])
+                                                yield make_chunk(")\n")
                                             else:
                                                 yield make_chunk(f"![Generated Image]({base64_str})\n")
                                         else:
-                                            yield make_chunk(f"![Generated Image]({proxy_url})\n")
+                                            yield make_chunk(f"![Generated Image]({base64_str})\n")
                                     else:
-                                        # URL模式 - 预缓存（失败不影响，/images/ 端点会按需下载）
-                                        await image_cache_service.download_image(f"/{img}", auth_token)
-                                        content += f"![Generated Image]({proxy_url})\n\n"
-                                except Exception as e:
-                                    logger.warning(f"[Processor] 处理图片失败: {e}")
+                                        yield make_chunk(f"![Generated Image]({proxy_url})\n")
+                                else:
                                     content += f"![Generated Image]({proxy_url})\n\n"
 
                             # Blank line before images for proper markdown paragraph separation
-                            yield make_chunk("\n\n" + content.strip() + "\n")
-                            yield make_chunk("", "stop")
+                            # 最终内容与结束标记合并为一帧
+                            yield make_chunk("\n\n" + content.strip() + "\n", "stop")
+                            yield _SSE_DONE
                             return
                         elif token:
                             yield make_chunk(token)
@@ -297,10 +409,10 @@ class GrokResponseProcessor:
                         if isinstance(token, list):
                             continue
 
-                        if any(tag in token for tag in filtered_tags if token):
+                        if filter_re and token and filter_re.search(token):
                             continue
 
-                        current_is_thinking = grok_resp.get("isThinking", False)
+                        current_is_thinking = bool(grok_resp.get("isThinking", False))
                         message_tag = grok_resp.get("messageTag")
 
                         if thinking_finished and current_is_thinking:
@@ -311,13 +423,13 @@ class GrokResponseProcessor:
                             if web_search := grok_resp.get("webSearchResults"):
                                 if current_is_thinking:
                                     if show_thinking:
-                                        for result in web_search.get("results", []):
-                                            title = result.get("title", "")
-                                            url = result.get("url", "")
+                                        parts = [token]
+                                        for result in web_search.get("results", ()):
                                             preview = result.get("preview", "")
-                                            preview_clean = preview.replace("\n", "") if isinstance(preview, str) else ""
-                                            token += f'\n- [{title}]({url} "{preview_clean}")'
-                                        token += "\n"
+                                            preview_clean = preview.translate(_STRIP_NEWLINES) if isinstance(preview, str) else ""
+                                            parts.append(f'\n- [{result.get("title", "")}]({result.get("url", "")} "{preview_clean}")')
+                                        parts.append("\n")
+                                        token = "".join(parts)
                                     else:
                                         continue
                                 else:
@@ -331,24 +443,13 @@ class GrokResponseProcessor:
                             if message_tag == "header":
                                 content = f"\n\n{token}\n\n"
 
-                            # Thinking状态切换
-                            should_skip = False
-                            if not is_thinking and current_is_thinking:
-                                if show_thinking:
-                                    content = f"<think>\n{content}"
-                                else:
-                                    should_skip = True
-                            elif is_thinking and not current_is_thinking:
-                                if show_thinking:
-                                    content = f"\n</think>\n{content}"
+                            # Thinking状态切换：查表得到前缀（None 表示不输出）及是否结束思考
+                            prefix, finishes = think_table[is_thinking, current_is_thinking]
+                            if finishes:
                                 thinking_finished = True
-                            elif current_is_thinking:
-                                if not show_thinking:
-                                    should_skip = True
+                            if prefix is not None:
+                                yield make_chunk(prefix + content if prefix else content)
 
-                            if not should_skip:
-                                yield make_chunk(content)
-                            
                             is_thinking = current_is_thinking
 
                 except GrokApiException:
@@ -361,7 +462,7 @@ class GrokResponseProcessor:
                     continue
 
             yield make_chunk("", "stop")
-            yield "data: [DONE]\n\n"
+            yield _SSE_DONE
             logger.info(f"[Processor] 流式完成，耗时: {timeout_mgr.duration():.2f}秒")
 
         except GrokApiException:
@@ -369,11 +470,12 @@ class GrokResponseProcessor:
         except Exception as e:
             logger.error(f"[Processor] 严重错误: {e}")
             yield make_chunk(f"处理错误: {e}", "error")
-            yield "data: [DONE]\n\n"
+            yield _SSE_DONE
         finally:
-            if not response_closed and hasattr(response, 'close'):
+            close = getattr(response, 'close', None)
+            if not response_closed and close is not None:
                 try:
-                    response.close()
+                    close()
                     logger.debug("[Processor] 响应已关闭")
                 except Exception as e:
                     logger.warning(f"[Processor] 关闭失败: {e}")
@@ -386,15 +488,13 @@ class GrokResponseProcessor:
                     logger.warning(f"[Processor] 关闭会话失败: {e}")
 
     @staticmethod
-    async def _build_video_content(video_url: str, auth_token: str) -> str:
+    async def _build_video_content(video_url: str, auth_token: str, base_url: Optional[str] = None) -> str:
         """构建视频内容"""
         logger.debug(f"[Processor] 检测到视频: {video_url}")
-        proxy_url = GrokResponseProcessor._image_proxy_url(video_url)
+        proxy_url = GrokResponseProcessor._image_proxy_url(video_url, get_base_url() if base_url is None else base_url)
 
-        try:
-            await video_cache_service.download_video(f"/{video_url}", auth_token)
-        except Exception as e:
-            logger.warning(f"[Processor] 预缓存视频失败: {e}")
+        # 后台预缓存，不阻塞响应（/images/ 端点未命中时会按需下载）
+        spawn_background(video_cache_service.download_video(f"/{video_url}", auth_token))
 
         return f'<video src="{proxy_url}" controls="controls" width="500" height="300"></video>\n'
 
@@ -402,52 +502,60 @@ class GrokResponseProcessor:
     async def _append_images(content: str, images: list, auth_token: str) -> str:
         """追加图片到内容"""
         image_mode = setting.global_config.get("image_mode", "url")
+        imgs = [img for img in images if img]
+        paths = [f"/{img}" for img in imgs]
+        base_url = get_base_url()
 
-        for img in images:
-            if not img:
+        if image_mode == "base64":
+            # 并发下载（失败时回退为代理 URL）
+            results = await asyncio.gather(
+                *(image_cache_service.download_base64(path, auth_token) for path in paths),
+                return_exceptions=True
+            )
+        else:
+            # 后台预缓存，不阻塞响应（/images/ 端点未命中时会按需下载）
+            for path in paths:
+                spawn_background(image_cache_service.download_image(path, auth_token))
+            results = [None] * len(imgs)
+
+        for img, result in zip(imgs, results):
+            if isinstance(result, Exception):
+                logger.warning(f"[Processor] 处理图片失败: {result}")
+            elif image_mode == "base64" and result:
+                content += f"\n![Generated Image]({result})"
                 continue
-            proxy_url = GrokResponseProcessor._image_proxy_url(img)
-            try:
-                if image_mode == "base64":
-                    base64_str = await image_cache_service.download_base64(f"/{img}", auth_token)
-                    if base64_str:
-                        content += f"\n![Generated Image]({base64_str})"
-                    else:
-                        content += f"\n![Generated Image]({proxy_url})"
-                else:
-                    # 预缓存（失败不影响，/images/ 端点会按需下载）
-                    await image_cache_service.download_image(f"/{img}", auth_token)
-                    content += f"\n![Generated Image]({proxy_url})"
-            except Exception as e:
-                logger.warning(f"[Processor] 处理图片失败: {e}")
-                content += f"\n![Generated Image]({proxy_url})"
-        
+            content += f"\n![Generated Image]({GrokResponseProcessor._image_proxy_url(img, base_url)})"
+
         return content
 
     @staticmethod
-    def _build_response(content: str, model: str, prompt_text: str = "") -> OpenAIChatCompletionResponse:
-        """构建响应对象"""
+    def _build_response(content: str, model: str, prompt_text: str = "") -> Dict[str, Any]:
+        """构建响应字典"""
         # 粗略估算 token 数（字符数/4）
-        prompt_tokens = max(len(prompt_text) // 4, 1) if prompt_text else 0
-        completion_tokens = max(len(content) // 4, 1)
+        prompt_tokens = (len(prompt_text) >> 2) or 1 if prompt_text else 0
+        completion_tokens = (len(content) >> 2) or 1
         total_tokens = prompt_tokens + completion_tokens
 
-        return OpenAIChatCompletionResponse(
-            id=f"chatcmpl-{uuid.uuid4()}",
-            object="chat.completion",
-            created=int(time.time()),
-            model=model,
-            choices=[OpenAIChatCompletionChoice(
-                index=0,
-                message=OpenAIChatCompletionMessage(
-                    role="assistant",
-                    content=content
-                ),
-                finish_reason="stop"
-            )],
-            usage={
+        # 直接构建字典（字段与 OpenAIChatCompletionResponse 一致），跳过 Pydantic 校验
+        return {
+            "id": f"chatcmpl-{uuid.uuid4()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": content,
+                    "reference_id": None,
+                    "annotations": None
+                },
+                "logprobs": None,
+                "finish_reason": "stop"
+            }],
+            "usage": {
                 "prompt_tokens": prompt_tokens,
                 "completion_tokens": completion_tokens,
                 "total_tokens": total_tokens
             }
-        )
+        }
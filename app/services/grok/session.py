@@ -0,0 +1,47 @@
+"""共享 HTTP 会话 - 复用 curl_cffi AsyncSession 的连接池与 TLS 会话"""
+
+from functools import lru_cache
+from typing import Dict, Optional
+from curl_cffi.requests import AsyncSession
+
+from app.core.logger import logger
+
+
+# 常量
+BROWSER = "chrome133a"
+MAX_CLIENTS = 200  # 并发连接上限（curl_cffi 默认仅 10）
+
+_session: Optional[AsyncSession] = None
+
+
+def get_session() -> AsyncSession:
+    """获取共享会话（延迟创建）
+
+    代理和 impersonate 可在每次请求中单独指定；丢弃响应 Cookie，
+    避免不同 token 的 Cookie 串用。
+    """
+    global _session
+    if _session is None:
+        _session = AsyncSession(impersonate=BROWSER, max_clients=MAX_CLIENTS, discard_cookies=True)
+        logger.debug(f"[Session] 创建共享会话, max_clients={MAX_CLIENTS}")
+    return _session
+
+
+@lru_cache(maxsize=256)
+def build_proxies(proxy: Optional[str]) -> Optional[Dict[str, str]]:
+    """构建 curl_cffi proxies 参数（按代理URL缓存，返回值只读共享）"""
+    if not proxy:
+        return None
+    return {"http": proxy, "https": proxy}
+
+
+async def close_session() -> None:
+    """关闭共享会话"""
+    global _session
+    if _session is not None:
+        session, _session = _session, None
+        try:
+            await session.close()
+            logger.debug("[Session] 共享会话已关闭")
+        except Exception as e:
+            logger.warning(f"[Session] 关闭共享会话失败: {e}")
@@ -4,7 +4,8 @@ import base64
 import random
 import string
 import uuid
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional
 
 from app.core.logger import logger
 from app.core.config import setting
@@ -52,6 +53,19 @@ def _generate_statsig_id() -> str:
     return base64.b64encode(msg.encode()).decode()
 
 
+@lru_cache(maxsize=16)
+def _static_headers(content_type: str, statsig_id: Optional[str]) -> Dict[str, str]:
+    """构建不随请求变化的请求头模板（按 Content-Type 和固定 statsig-id 缓存）
+
+    x-xai-request-id 仅占位以保持请求头顺序，每次请求在副本上覆盖。
+    """
+    headers = BASE_HEADERS.copy()
+    headers["x-statsig-id"] = statsig_id
+    headers["x-xai-request-id"] = ""
+    headers["Content-Type"] = content_type
+    return headers
+
+
 def get_dynamic_headers(pathname: str = "/rest/app-chat/conversations/new") -> Dict[str, str]:
     """获取请求头
     
@@ -62,7 +76,8 @@ def get_dynamic_headers(pathname: str = "/rest/app-chat/conversations/new") -> D
         完整的请求头字典
     """
     # 获取或生成statsig-id
-    if setting.grok_config.get("dynamic_statsig", False):
+    dynamic = setting.grok_config.get("dynamic_statsig", False)
+    if dynamic:
         statsig_id = _generate_statsig_id()
         logger.debug(f"[Statsig] 动态生成: {statsig_id}")
     else:
@@ -71,10 +86,13 @@ def get_dynamic_headers(pathname: str = "/rest/app-chat/conversations/new") -> D
             raise ValueError("配置文件中未设置 x_statsig_id")
         logger.debug(f"[Statsig] 使用固定值: {statsig_id}")
 
-    # 构建请求头
-    headers = BASE_HEADERS.copy()
-    headers["x-statsig-id"] = statsig_id
+    # 构建请求头（复制缓存模板，动态 statsig-id 不参与缓存）
+    content_type = "text/plain;charset=UTF-8" if "upload-file" in pathname else "application/json"
+    if dynamic:
+        headers = _static_headers(content_type, None).copy()
+        headers["x-statsig-id"] = statsig_id
+    else:
+        headers = _static_headers(content_type, statsig_id).copy()
     headers["x-xai-request-id"] = str(uuid.uuid4())
-    headers["Content-Type"] = "text/plain;charset=UTF-8" if "upload-file" in pathname else "application/json"
 
     return headers
\ No newline at end of file
@@ -6,7 +6,6 @@ import asyncio
 import aiofiles
 import portalocker
 from pathlib import Path
-from curl_cffi.requests import AsyncSession
 from typing import Dict, Any, Optional, Tuple
 
 from app.models.grok_models import TokenType, Models
@@ -14,6 +13,7 @@ from app.core.exception import GrokApiException
 from app.core.logger import logger
 from app.core.config import setting
 from app.core.retry import async_request_with_retry
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 
 
@@ -371,20 +371,20 @@ class GrokTokenManager:
             headers = get_dynamic_headers("/rest/rate-limits")
             headers["Cookie"] = f"{auth_token};{cf}" if cf else auth_token
 
-            async def do_request(proxy, retry_info):
-                proxies = {"http": proxy, "https": proxy} if proxy else None
-                async with AsyncSession() as session:
-                    response = await session.post(
-                        RATE_LIMIT_API,
-                        headers=headers,
-                        json=payload,
-                        impersonate=BROWSER,
-                        timeout=TIMEOUT,
-                        proxies=proxies
-                    )
-                    if response.status_code != 200:
-                        return {"status_code": response.status_code, "response": response}
-                    return response.json()
+            async def do_request(proxy, outer_retry, retry_403_count):
+                proxies = build_proxies(proxy)
+                session = get_session()
+                response = await session.post(
+                    RATE_LIMIT_API,
+                    headers=headers,
+                    json=payload,
+                    impersonate=BROWSER,
+                    timeout=TIMEOUT,
+                    proxies=proxies
+                )
+                if response.status_code != 200:
+                    return {"status_code": response.status_code, "response": response}
+                return response.json()
 
             result = await async_request_with_retry(do_request, log_prefix="[Token]")
 
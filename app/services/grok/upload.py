@@ -7,6 +7,7 @@ from typing import Tuple, Optional
 from urllib.parse import urlparse
 from curl_cffi.requests import AsyncSession
 
+from app.services.grok.session import build_proxies, get_session
 from app.services.grok.statsig import get_dynamic_headers
 from app.core.exception import GrokApiException
 from app.core.config import setting
@@ -58,30 +59,30 @@ class ImageUploadManager:
             if not auth_token:
                 raise GrokApiException("认证令牌缺失", "NO_AUTH_TOKEN")
 
-            async def do_request(proxy, retry_info):
+            async def do_request(proxy, outer_retry, retry_403_count):
                 cf = setting.grok_config.get("cf_clearance", "")
                 headers = {
                     **get_dynamic_headers("/rest/app-chat/upload-file"),
                     "Cookie": f"{auth_token};{cf}" if cf else auth_token,
                 }
-                proxies = {"http": proxy, "https": proxy} if proxy else None
-
-                async with AsyncSession() as session:
-                    response = await session.post(
-                        UPLOAD_API,
-                        headers=headers,
-                        json=data,
-                        impersonate=BROWSER,
-                        timeout=TIMEOUT,
-                        proxies=proxies,
-                    )
-                    if response.status_code != 200:
-                        return {"status_code": response.status_code}
-                    result = response.json()
-                    file_id = result.get("fileMetadataId", "")
-                    file_uri = result.get("fileUri", "")
-                    logger.debug(f"[Upload] 成功，ID: {file_id}")
-                    return file_id, file_uri
+                proxies = build_proxies(proxy)
+
+                session = get_session()
+                response = await session.post(
+                    UPLOAD_API,
+                    headers=headers,
+                    json=data,
+                    impersonate=BROWSER,
+                    timeout=TIMEOUT,
+                    proxies=proxies,
+                )
+                if response.status_code != 200:
+                    return {"status_code": response.status_code}
+                result = response.json()
+                file_id = result.get("fileMetadataId", "")
+                file_uri = result.get("fileUri", "")
+                logger.debug(f"[Upload] 成功，ID: {file_id}")
+                return file_id, file_uri
 
             result = await async_request_with_retry(do_request, log_prefix="[Upload]")
 
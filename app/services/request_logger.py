@@ -41,6 +41,12 @@ class RequestLogger:
         self._logs: Deque[Dict] = deque(maxlen=max_len)
         self._lock = asyncio.Lock()
         self._loaded = False
+
+        # 后台写入队列
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        self._worker_task = None
+        self._dropped = 0
+        self._pending_tasks: set = set()  # 持有即时写入任务的强引用，防止被 GC 回收
         
         self._initialized = True
 
@@ -88,6 +94,24 @@ class RequestLogger:
         except Exception as e:
             logger.error(f"[Logger] 保存日志失败: {e}")
 
+    @staticmethod
+    def _make_log(ip: str, model: str, duration: float, status: int,
+                  key_name: str, token_suffix: str = "", error: str = "") -> Dict:
+        """构建日志条目"""
+        now = time.time()
+        return {
+            "id": str(int(now * 1000)),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "timestamp": now,
+            "ip": ip,
+            "model": model,
+            "duration": round(duration, 2),
+            "status": status,
+            "key_name": key_name,
+            "token_suffix": token_suffix,
+            "error": error
+        }
+
     async def add_log(self, 
                      ip: str, 
                      model: str, 
@@ -101,22 +125,7 @@ class RequestLogger:
             await self.init()
             
         try:
-            now = time.time()
-            # 格式化时间
-            time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
-            
-            log = {
-                "id": str(int(now * 1000)),
-                "time": time_str,
-                "timestamp": now,
-                "ip": ip,
-                "model": model,
-                "duration": round(duration, 2),
-                "status": status,
-                "key_name": key_name,
-                "token_suffix": token_suffix,
-                "error": error
-            }
+            log = self._make_log(ip, model, duration, status, key_name, token_suffix, error)
             
             async with self._lock:
                 self._logs.appendleft(log) # 最新的在前
@@ -127,6 +136,69 @@ class RequestLogger:
         except Exception as e:
             logger.error(f"[Logger] 记录日志失败: {e}")
 
+    def log_nowait(self,
+                   ip: str,
+                   model: str,
+                   duration: float,
+                   status: int,
+                   key_name: str,
+                   token_suffix: str = "",
+                   error: str = "") -> None:
+        """提交日志到后台队列（不阻塞请求路径）"""
+        if self._worker_task is None:
+            # 后台任务未启动时退回即时写入
+            task = asyncio.create_task(self.add_log(ip, model, duration, status, key_name, token_suffix, error))
+            self._pending_tasks.add(task)
+            task.add_done_callback(self._pending_tasks.discard)
+            return
+
+        try:
+            self._queue.put_nowait(self._make_log(ip, model, duration, status, key_name, token_suffix, error))
+        except asyncio.QueueFull:
+            self._dropped += 1
+            if self._dropped % 1000 == 1:
+                logger.warning(f"[Logger] 日志队列已满，累计丢弃 {self._dropped} 条")
+
+    async def _drain(self, first: Dict = None) -> None:
+        """取出队列中的全部日志批量写入"""
+        batch = [first] if first is not None else []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if not batch:
+            return
+
+        async with self._lock:
+            self._logs.extendleft(batch)  # 逐条插到头部，最新的在前
+        await self._save_data()
+
+    async def _log_worker(self) -> None:
+        """后台日志写入任务"""
+        while True:
+            log = await self._queue.get()
+            try:
+                await self._drain(log)
+            except Exception as e:
+                logger.error(f"[Logger] 批量写入日志失败: {e}")
+
+    async def start_worker(self) -> None:
+        """启动后台写入任务"""
+        if self._worker_task is None:
+            await self.init()
+            self._worker_task = asyncio.create_task(self._log_worker())
+            logger.info("[Logger] 后台写入任务已启动")
+
+    async def shutdown(self) -> None:
+        """关闭后台任务并写入剩余日志"""
+        if self._worker_task:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+
+        await self._drain()
+
     async def get_logs(self, limit: int = 1000) -> List[Dict]:
         """获取日志"""
         async with self._lock:
@@ -151,6 +151,10 @@ class RequestStats:
         if not self._loaded:
             await self.init()
 
+        self.record(model, success)
+
+    def record(self, model: str, success: bool) -> None:
+        """记录一次请求（同步更新内存计数，由后台任务批量保存）"""
         now = datetime.now()
         hour_key = now.strftime("%Y-%m-%dT%H")
         day_key = now.strftime("%Y-%m-%d")
@@ -93,8 +93,9 @@ async def lifespan(app: FastAPI):
     # 4. 启动批量保存任务
     await token_manager.start_batch_save()
 
-    # 4.5. 启动统计模块批量保存
+    # 4.5. 启动统计模块批量保存和日志后台写入
     await request_stats.start_batch_save()
+    await request_logger.start_worker()
 
     # 4.6. 启动会话过期清理任务
     from app.api.admin.manage import cleanup_expired_sessions
@@ -122,13 +123,21 @@ async def lifespan(app: FastAPI):
         await mcp_lifespan_context.__aexit__(None, None, None)
         logger.info("[MCP] MCP服务已关闭")
 
-        # 2. 关闭批量保存任务并刷新数据
+        # 2. 停止后台任务，关闭批量保存任务并刷新数据
+        from app.services.grok.client import GrokClient
+        await GrokClient.shutdown_background()
         await token_manager.shutdown()
         logger.info("[Token] Token管理器已关闭")
 
-        # 2.5 关闭统计模块
+        # 2.5 关闭统计模块和日志写入
         await request_stats.shutdown()
         logger.info("[Stats] 统计模块已关闭")
+        await request_logger.shutdown()
+        logger.info("[Logger] 日志模块已关闭")
+
+        # 2.6 关闭共享 HTTP 会话
+        from app.services.grok.session import close_session
+        await close_session()
 
         # 3. 关闭核心服务
         await storage_manager.close()
@@ -0,0 +1,44 @@
+"""重试逻辑测试 - 传输层异常判定"""
+
+import asyncio
+
+from curl_cffi import requests
+from curl_cffi.requests.exceptions import HTTPError
+
+from app.core.exception import GrokApiException
+from app.core.retry import is_transient
+
+
+def _raise_refused():
+    """连接本地未监听端口，触发真实的 curl_cffi 连接异常"""
+    try:
+        requests.get("http://127.0.0.1:9/", timeout=3)
+    except Exception as e:
+        return e
+    raise AssertionError("连接未被拒绝")
+
+
+def test_curl_connection_error_is_transient():
+    assert is_transient(_raise_refused())
+
+
+def test_timeout_and_network_error_are_transient():
+    assert is_transient(asyncio.TimeoutError())
+    assert is_transient(GrokApiException("网络错误", "NETWORK_ERROR"))
+
+
+def test_wrapped_transport_error_is_transient():
+    try:
+        raise GrokApiException("响应处理错误", "PROCESS_ERROR") from _raise_refused()
+    except GrokApiException as e:
+        assert is_transient(e)
+    try:
+        raise GrokApiException("响应处理错误", "PROCESS_ERROR") from ValueError("bad")
+    except GrokApiException as e:
+        assert not is_transient(e)
+
+
+def test_non_transport_errors_are_not_transient():
+    assert not is_transient(ValueError("bad"))
+    assert not is_transient(HTTPError("404"))
+    assert not is_transient(GrokApiException("认证令牌缺失", "NO_AUTH_TOKEN"))